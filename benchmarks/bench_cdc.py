@@ -0,0 +1,42 @@
+"""Benchmark content-defined chunking against plain whole-file hashing."""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from xycrypto.cdc import chunk_file        # NOQA; isort:skip
+from xycrypto.hashes import SHA256         # NOQA; isort:skip
+
+
+def measure(func, size):
+    start = time.perf_counter()
+    func()
+    return size / (time.perf_counter() - start) / 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark content-defined chunking.')
+    parser.add_argument('-s', '--size', type=int, default=16, help='size of test file in MiB')
+    parser.add_argument('-w', '--workers', type=int, default=0, help='hashing threads')
+    args = parser.parse_args()
+
+    size = args.size * 0x100000
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(os.urandom(size))
+    try:
+        print('{:<24} {:8.3f} GB/s'.format(
+            'SHA256.hash_file', measure(lambda: SHA256.hash_file(f.name), size)))
+        print('{:<24} {:8.3f} GB/s'.format(
+            'cdc.chunk_file', measure(
+                lambda: chunk_file(f.name, SHA256, workers=args.workers), size)))
+    finally:
+        os.remove(f.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Benchmark constructing ciphers directly against fetching them from a CipherCache."""
+
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from xycrypto.ciphers import AES_CBC, AES_GCM      # NOQA; isort:skip
+from xycrypto.ciphers.cache import CipherCache     # NOQA; isort:skip
+
+
+def measure(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cipher cache.')
+    parser.add_argument('-n', '--number', type=int, default=20000, help='calls per repeat')
+    parser.add_argument('-t', '--tenants', type=int, default=1000, help='number of keys')
+    args = parser.parse_args()
+
+    keys = [os.urandom(16) for _ in range(args.tenants)]
+    iv, nonce = os.urandom(16), os.urandom(12)
+    cache = CipherCache(maxsize=args.tenants)
+    for key in keys:
+        cache.cipher(AES_CBC, key, iv=iv)
+        cache.cipher(AES_GCM, key, nonce=nonce)
+
+    message = os.urandom(64)
+    cases = [
+        ('AES_CBC', lambda: AES_CBC(keys[0], iv=iv)),
+        ('CipherCache AES_CBC', lambda: cache.cipher(AES_CBC, keys[0], iv=iv)),
+        ('AES_GCM', lambda: AES_GCM(keys[0], nonce=nonce)),
+        ('CipherCache AES_GCM', lambda: cache.cipher(AES_GCM, keys[0], nonce=nonce)),
+        # Whole requests, including the per-request context.
+        ('AES_CBC encrypt', lambda: AES_CBC(keys[0], iv=iv).encrypt(message)),
+        ('CipherCache AES_CBC encrypt',
+         lambda: cache.cipher(AES_CBC, keys[0], iv=iv).encrypt(message)),
+        ('AES_GCM encrypt', lambda: AES_GCM(keys[0], nonce=nonce).encrypt(message)),
+        ('CipherCache AES_GCM encrypt',
+         lambda: cache.cipher(AES_GCM, keys[0], nonce=nonce).encrypt(message)),
+    ]
+    for name, func in cases:
+        print('{:<30} {:8.3f} us'.format(name, measure(func, args.number)))
+    print(cache.stats())
+
+
+if __name__ == '__main__':
+    main()
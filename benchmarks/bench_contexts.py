@@ -0,0 +1,73 @@
+"""Microbenchmark for construct + update + finalize of short-message contexts."""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from xycrypto.hashes import SHA256, SHAKE128   # NOQA; isort:skip
+from xycrypto.hmac import HMAC                  # NOQA; isort:skip
+from xycrypto.padding import PKCS7              # NOQA; isort:skip
+
+MESSAGE = b'x' * 64
+KEY = b'k' * 32
+
+
+def bench_hash():
+    ctx = SHA256()
+    ctx.update(MESSAGE)
+    return ctx.finalize()
+
+
+def bench_shake():
+    ctx = SHAKE128(digest_size=32)
+    ctx.update(MESSAGE)
+    return ctx.finalize()
+
+
+def bench_hmac():
+    ctx = HMAC(SHA256, KEY)
+    ctx.update(MESSAGE)
+    return ctx.finalize()
+
+
+_PKCS7 = PKCS7(16)
+
+
+def bench_padder():
+    padder = _PKCS7.padder()
+    return padder.update(MESSAGE) + padder.finalize()
+
+
+_PADDED = _PKCS7.pad(MESSAGE)
+
+
+def bench_unpadder():
+    unpadder = _PKCS7.unpadder()
+    return unpadder.update(_PADDED) + unpadder.finalize()
+
+
+BENCHMARKS = [
+    ('SHA256', bench_hash),
+    ('SHAKE128', bench_shake),
+    ('HMAC-SHA256', bench_hmac),
+    ('PKCS7 padder', bench_padder),
+    ('PKCS7 unpadder', bench_unpadder),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark short-message contexts.')
+    parser.add_argument('-n', '--number', type=int, default=100000, help='calls per round')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='number of rounds')
+    args = parser.parse_args()
+
+    for name, func in BENCHMARKS:
+        best = min(timeit.repeat(func, number=args.number, repeat=args.repeat))
+        print('{:<16} {:8.0f} ns/msg'.format(name, best / args.number * 1e9))
+
+
+if __name__ == '__main__':
+    main()
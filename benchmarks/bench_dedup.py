@@ -0,0 +1,72 @@
+"""Benchmark staged duplicate finding and tree comparison against full hashing of every file."""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from xycrypto import _fs                   # NOQA; isort:skip
+from xycrypto.hashes import SHA256         # NOQA; isort:skip
+
+
+def make_tree(root, files, max_size, duplicates):
+    rng = random.Random(0)
+    paths = []
+    for i in range(files):
+        path = os.path.join(root, 'd{}'.format(i % 16), 'f{}'.format(i))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if paths and rng.random() < duplicates:
+            shutil.copyfile(rng.choice(paths), path)
+        else:
+            with open(path, 'wb') as f:
+                f.write(os.urandom(rng.randrange(max_size)))
+        paths.append(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark staged duplicate finding.')
+    parser.add_argument('-n', '--files', type=int, default=1000, help='number of files')
+    parser.add_argument('-s', '--size', type=int, default=4, help='max file size in MiB')
+    parser.add_argument('-d', '--duplicates', type=float, default=0.1,
+                        help='fraction of files which are copies')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root, args.files, args.size * 0x100000, args.duplicates)
+        paths = list(_fs.iter_files(root))
+        total = sum(os.path.getsize(path) for path in paths)
+
+        start = time.perf_counter()
+        SHA256.hash_files(paths, executor='thread')
+        print('{:<28} {:8.3f} s, read {:.1%}'.format(
+            'SHA256.hash_files', time.perf_counter() - start, 1.0))
+
+        start = time.perf_counter()
+        result = SHA256.find_duplicates(root)
+        print('{:<28} {:8.3f} s, read {:.1%}, {} groups'.format(
+            'SHA256.find_duplicates', time.perf_counter() - start,
+            result.bytes_read / total, len(result)))
+
+        copy = root + '.copy'
+        shutil.copytree(root, copy)
+        try:
+            start = time.perf_counter()
+            result = SHA256.compare_trees(root, copy)
+            print('{:<28} {:8.3f} s, read {:.1%}, {} same'.format(
+                'SHA256.compare_trees', time.perf_counter() - start,
+                result.bytes_read / (2 * total), len(result.same)))
+        finally:
+            shutil.rmtree(copy)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -41,5 +41,8 @@ setup(
     install_requires=[
         'cryptography>=2.8',
     ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     python_requires='>=3.6'
 )
@@ -0,0 +1,88 @@
+import collections
+import threading
+import time
+
+_MISSING = object()
+
+
+class TTLCache(object):
+    """Thread-safe LRU cache with optional time-to-live of entries."""
+
+    def __init__(self, maxsize=128, ttl=None):
+        if maxsize < 1:
+            raise ValueError('maxsize must be >= 1, got {}'.format(maxsize))
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Return the value for key if key is cached and not expired, else default."""
+
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Cache value for key, evicting the least recently used entry if full."""
+
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = value, expires
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, func):
+        """Return the value for key, calling func() and caching its result on miss."""
+
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = func()
+            self.put(key, value)
+        return value
+
+    def evict_expired(self):
+        """Remove all expired entries."""
+
+        if self.ttl is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, (_, expires) in self._data.items() if expires <= now]:
+                del self._data[key]
+
+    def clear(self):
+        """Remove all entries and reset statistics."""
+
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return dict of cache statistics."""
+
+        with self._lock:
+            return {
+                'hits': self.hits, 'misses': self.misses,
+                'size': len(self._data), 'maxsize': self.maxsize
+            }
@@ -0,0 +1,233 @@
+import concurrent.futures
+import fnmatch
+import itertools
+import json
+import os
+import re
+
+from xycrypto import tuning
+
+_EXECUTORS = {'serial', 'thread', 'process'}
+
+# Options of `hash_file`, which the directory methods forward but hash contexts do not take.
+_FILE_OPTIONS = frozenset(['buffers', 'buffer_size', 'resume', 'checkpoint'])
+
+# Batching heuristics for parallel file hashing. Aim for several batches per worker so the
+# load stays balanced, but keep each batch large enough to amortize the round trip to the
+# worker. Tiny files are grouped by count, big files end up in a batch of their own.
+_BATCHES_PER_WORKER = 4
+_MIN_BATCH_BYTES = 0x400000
+_MAX_BATCH_BYTES = 0x4000000
+_MAX_BATCH_FILES = 1024
+
+
+def _compile_patterns(patterns):
+    if patterns is None:
+        return None
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    return re.compile('|'.join(fnmatch.translate(p) for p in patterns)).match
+
+
+def _is_ancestor(node, key):
+    while node is not None:
+        if node[0] == key:
+            return True
+        node = node[1]
+    return False
+
+
+def _dir_key(path):
+    st = os.stat(path)
+    return st.st_dev, st.st_ino
+
+
+def walk_files(dirpath, follow_symlinks=True, include=None, exclude=None):
+    """Yield (path, relpath) of all files under directory.
+
+    The directory is walked iteratively with an explicit stack. If follow_symlinks is false,
+    symbolic links are skipped; otherwise they are followed, and a directory which is its own
+    ancestor is skipped to break loops. The include and exclude are glob patterns matched
+    against paths relative to dirpath with '/' separators; excluded directories are pruned.
+    """
+
+    include = _compile_patterns(include)
+    exclude = _compile_patterns(exclude)
+
+    # Each node is (key, parent) where key identifies the directory by (st_dev, st_ino).
+    stack = [(os.fspath(dirpath), '', (_dir_key(dirpath), None))]
+    while stack:
+        path, prefix, node = stack.pop()
+        with os.scandir(path) as it:
+            entries = list(it)
+
+        for entry in entries:
+            relpath = prefix + entry.name
+            if exclude is not None and exclude(relpath):
+                continue
+
+            if entry.is_symlink():
+                if not follow_symlinks:
+                    continue
+                if entry.is_dir():
+                    key = _dir_key(entry.path)
+                    if _is_ancestor(node, key):
+                        continue
+                    stack.append((entry.path, relpath + '/', (key, node)))
+                    continue
+            elif entry.is_dir(follow_symlinks=False):
+                stack.append((entry.path, relpath + '/', (_dir_key(entry.path), node)))
+                continue
+
+            if include is None or include(relpath):
+                yield entry.path, relpath
+
+
+def iter_files(dirpath, follow_symlinks=True, include=None, exclude=None):
+    """Yield paths of all files under directory. See `walk_files`."""
+
+    for path, _ in walk_files(dirpath, follow_symlinks, include, exclude):
+        yield path
+
+
+def context_kwargs(kwargs):
+    """Return kwargs without the options of `hash_file`, to construct the hash context."""
+
+    return {k: v for k, v in kwargs.items() if k not in _FILE_OPTIONS}
+
+
+def xor_fold(digests, digest_size):
+    """Return XOR of all digests."""
+
+    result = 0
+    for digest in digests:
+        result ^= int.from_bytes(digest, 'big')
+    return result.to_bytes(digest_size, 'big')
+
+
+def try_call(func, path):
+    """Return (func(path), None), or (None, error) if it raises OSError.
+
+    This keeps one unreadable file from failing the whole batch.
+    """
+
+    try:
+        return func(path), None
+    except OSError as e:
+        return None, e
+
+
+def load_json(filepath):
+    """Return the JSON object in file, or None if it is missing, unreadable or no object."""
+
+    try:
+        with open(filepath, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def save_json(filepath, state):
+    """Write state as JSON to file, replacing it at once so readers never see half of it."""
+
+    temp = filepath + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump(state, f)
+    os.replace(temp, filepath)
+
+
+def _getsize(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0    # let the worker raise the real error
+
+
+def _batch_paths(paths, workers):
+    sizes = [_getsize(path) for path in paths]
+    parts = workers * _BATCHES_PER_WORKER
+    max_bytes = min(max(sum(sizes) // parts, _MIN_BATCH_BYTES), _MAX_BATCH_BYTES)
+    max_files = min(max(len(paths) // parts, 1), _MAX_BATCH_FILES)
+
+    batch, batch_bytes = [], 0
+    for path, size in zip(paths, sizes):
+        batch.append(path)
+        batch_bytes += size
+        if batch_bytes >= max_bytes or len(batch) >= max_files:
+            yield batch
+            batch, batch_bytes = [], 0
+    if batch:
+        yield batch
+
+
+def _apply_batch(func, batch):
+    return [func(path) for path in batch]
+
+
+def _check_executor(executor):
+    if not (executor is None or executor in _EXECUTORS
+            or isinstance(executor, concurrent.futures.Executor)):
+        raise ValueError('executor must be in {}, got {}'.format(_EXECUTORS, executor))
+
+
+def _create_pool(executor, workers):
+    if executor == 'thread':
+        return concurrent.futures.ThreadPoolExecutor(workers)
+    return concurrent.futures.ProcessPoolExecutor(workers)
+
+
+def map_files(func, paths, executor=None, workers=None):
+    """Return list of func(path) for each path, in input order.
+
+    The executor is one of None, 'serial', 'thread', 'process' or an instance of
+    `concurrent.futures.Executor`. Paths are sent to the workers in batches.
+    """
+
+    _check_executor(executor)
+    paths = list(paths)
+    if executor is None or executor == 'serial':
+        return [func(path) for path in paths]
+
+    owned = not isinstance(executor, concurrent.futures.Executor)
+    workers = workers or tuning.workers()
+    batches = list(_batch_paths(paths, workers))
+    if owned and len(batches) <= 1:
+        return [func(path) for path in paths]   # not worth starting workers
+
+    pool = _create_pool(executor, workers) if owned else executor
+    try:
+        it = pool.map(_apply_batch, itertools.repeat(func), batches)
+        return list(itertools.chain.from_iterable(it))
+    finally:
+        if owned:
+            pool.shutdown()
+
+
+def imap_files(func, paths, executor=None, workers=None):
+    """Yield (path, func(path)) for each path, in the order batches complete.
+
+    Closing the generator early cancels the batches not started yet.
+    """
+
+    _check_executor(executor)
+    paths = list(paths)
+    if executor is None or executor == 'serial':
+        for path in paths:
+            yield path, func(path)
+        return
+
+    owned = not isinstance(executor, concurrent.futures.Executor)
+    workers = workers or tuning.workers()
+    pool = _create_pool(executor, workers) if owned else executor
+    futures = {}
+    try:
+        for batch in _batch_paths(paths, workers):
+            futures[pool.submit(_apply_batch, func, batch)] = batch
+        for future in concurrent.futures.as_completed(futures):
+            yield from zip(futures[future], future.result())
+    finally:
+        for future in futures:
+            future.cancel()
+        if owned:
+            pool.shutdown()
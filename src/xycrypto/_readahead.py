@@ -0,0 +1,74 @@
+import functools
+import queue
+import threading
+
+from xycrypto import tuning
+
+
+def _readinto(fileobj, view):
+    try:
+        readinto = fileobj.readinto
+    except AttributeError:
+        data = fileobj.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+    return readinto(view)
+
+
+def read_ahead(fileobj, buffer_size, buffers=2):
+    """Yield chunks of data from file object while a background thread reads the next ones.
+
+    The reader thread fills a ring of preallocated buffers. Each yielded memoryview is only
+    valid until the next chunk is requested, since its buffer is then handed back to the
+    reader thread.
+    """
+
+    if buffers < 2:
+        raise ValueError('buffers must be >= 2, got {}'.format(buffers))
+
+    free = queue.Queue()
+    full = queue.Queue()
+    for _ in range(buffers):
+        free.put(memoryview(bytearray(buffer_size)))
+
+    def reader():
+        try:
+            while True:
+                view = free.get()
+                if view is None:    # consumer has gone away
+                    return
+                n = _readinto(fileobj, view)
+                full.put((view, n))
+                if not n:
+                    return
+        except BaseException as e:
+            full.put((None, e))
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            view, n = full.get()
+            if view is None:
+                raise n
+            if not n:
+                return
+            yield view[:n]
+            free.put(view)
+    finally:
+        free.put(None)
+        thread.join()
+
+
+def iter_chunks(fileobj, buffer_size=None, buffers=0):
+    """Return iterator of chunks of data from file object.
+
+    If buffer_size is None, it is taken from the tuning profile. If buffers is nonzero, the
+    chunks are read ahead by a background thread.
+    """
+
+    if buffer_size is None:
+        buffer_size = tuning.buffer_size()
+    if buffers:
+        return read_ahead(fileobj, buffer_size, buffers)
+    return iter(functools.partial(fileobj.read, buffer_size), b'')
@@ -0,0 +1,213 @@
+"""Content-defined chunking.
+
+Chunk boundaries are chosen by a gear rolling hash (FastCDC), so they depend only on nearby
+content: inserting or removing bytes moves the boundaries around the edit and leaves the rest
+of the chunks, and their digests, unchanged.
+
+With NumPy installed, the rolling hash is computed for a whole buffer at once; the result is
+the same either way.
+"""
+
+import concurrent.futures
+import functools
+import hashlib
+
+try:
+    import numpy
+except ImportError:     # optional, accelerates `iter_chunks`
+    numpy = None
+
+__all__ = ['chunk_fileobj', 'chunk_file', 'iter_chunks']
+
+_MIN_SIZE = 0x800
+_AVG_SIZE = 0x2000
+_MAX_SIZE = 0x10000
+_READ_SIZE = 0x100000
+_HASH_BLOCK = 0x8000
+
+_MASK_64 = (1 << 64) - 1
+
+# The gear table is derived deterministically, so boundaries are stable across runs.
+_GEAR = tuple(
+    int.from_bytes(hashlib.sha256(bytes((i,))).digest()[:8], 'big') for i in range(256)
+)
+_GEAR_ARRAY = None if numpy is None else numpy.array(_GEAR, dtype=numpy.uint64)
+
+
+def _masks(avg_size):
+    # Normalized chunking: a harder mask before avg_size and an easier one after it. The gear
+    # hash shifts left, so its top bits depend on the longest window of input.
+    bits = avg_size.bit_length() - 1
+    mask_s = ((1 << (bits + 2)) - 1) << (64 - bits - 2)
+    mask_l = ((1 << (bits - 2)) - 1) << (64 - bits + 2)
+    return mask_s, mask_l
+
+
+def _find_cut(data, start, end, min_size, avg_size, max_size, mask_s, mask_l):
+    """Return the end of the chunk starting at start, not beyond end."""
+
+    size = end - start
+    if size <= min_size:
+        return end
+
+    gear = _GEAR
+    normal = start + min(avg_size, size)
+    end = start + min(max_size, size)
+
+    h = 0
+    i = start + min_size
+    for b in bytes(data[i:normal]):
+        h = ((h << 1) + gear[b]) & _MASK_64
+        i += 1
+        if not h & mask_s:
+            return i
+    for b in bytes(data[i:end]):
+        h = ((h << 1) + gear[b]) & _MASK_64
+        i += 1
+        if not h & mask_l:
+            return i
+    return end
+
+
+def _gear_zeros(data, mask_s, mask_l):
+    """Return boolean arrays of where the gear hash has no bit of mask_s, or mask_l, set.
+
+    The hash at each position is over the 64 bytes ending there; the older bytes are shifted
+    out of it anyway. It is the sum of the gear values shifted by their distance, and each
+    step below doubles the window a hash covers.
+    """
+
+    data = numpy.frombuffer(data, dtype=numpy.uint8)
+    size = len(data)
+    zero_s = numpy.empty(size, dtype=bool)
+    zero_l = numpy.empty(size, dtype=bool)
+    h = numpy.empty(_HASH_BLOCK + 63, dtype=numpy.uint64)
+    temp = numpy.empty(_HASH_BLOCK + 63, dtype=numpy.uint64)
+
+    # Work through the data in blocks which stay in cache, each with the 63 bytes before it.
+    for lo in range(0, size, _HASH_BLOCK):
+        hi = min(lo + _HASH_BLOCK, size)
+        ahead = min(lo, 63)
+        n = hi - lo + ahead
+        numpy.take(_GEAR_ARRAY, data[lo - ahead:hi], out=h[:n])
+        m = 1
+        while m < 64:
+            numpy.left_shift(h[:n - m], numpy.uint64(m), out=temp[:n - m])
+            numpy.add(h[m:n], temp[:n - m], out=h[m:n])
+            m <<= 1
+
+        block = h[ahead:n]
+        numpy.equal(numpy.bitwise_and(block, numpy.uint64(mask_s), out=temp[:hi - lo]), 0,
+                    out=zero_s[lo:hi])
+        numpy.equal(numpy.bitwise_and(block, numpy.uint64(mask_l), out=temp[:hi - lo]), 0,
+                    out=zero_l[lo:hi])
+    return zero_s, zero_l
+
+
+def _find_cut_numpy(data, zeros, start, end, min_size, avg_size, max_size, mask_s, mask_l):
+    """Same as `_find_cut`, using the `_gear_zeros` of data."""
+
+    size = end - start
+    if size <= min_size:
+        return end
+
+    gear = _GEAR
+    normal = start + min(avg_size, size)
+    end = start + min(max_size, size)
+
+    # The hash starts from zero past min_size, and only equals the hash over the last 64
+    # bytes once it has taken in 64 bytes, so roll it for those first.
+    h = 0
+    i = start + min_size
+    for b in bytes(data[i:min(i + 63, end)]):
+        h = ((h << 1) + gear[b]) & _MASK_64
+        i += 1
+        if not h & (mask_s if i <= normal else mask_l):
+            return i
+
+    for zero, lo, hi in ((zeros[0], i, normal), (zeros[1], max(i, normal), end)):
+        if lo < hi:
+            j = lo + int(zero[lo:hi].argmax())
+            if zero[j]:
+                return j + 1
+    return end
+
+
+def _check_sizes(min_size, avg_size, max_size):
+    if not 64 <= min_size <= avg_size <= max_size:
+        raise ValueError('require 64 <= min_size <= avg_size <= max_size')
+    if avg_size & (avg_size - 1):
+        raise ValueError('avg_size must be a power of 2, got {}'.format(avg_size))
+
+
+def iter_chunks(fileobj, *, min_size=_MIN_SIZE, avg_size=_AVG_SIZE, max_size=_MAX_SIZE):
+    """Yield (offset, chunk) of content-defined chunks of data from file object."""
+
+    _check_sizes(min_size, avg_size, max_size)
+    mask_s, mask_l = _masks(avg_size)
+    read_size = max(_READ_SIZE, max_size)
+
+    buffer = bytearray()
+    offset = 0
+    eof = False
+    while not eof or buffer:
+        if not eof and len(buffer) < max_size:
+            data = fileobj.read(read_size)
+            if data:
+                buffer += data
+            else:
+                eof = True
+            continue
+
+        pos = 0
+        zeros = None if numpy is None else _gear_zeros(buffer, mask_s, mask_l)
+        while len(buffer) - pos >= max_size or (eof and pos < len(buffer)):
+            if zeros is None:
+                cut = _find_cut(buffer, pos, len(buffer), min_size, avg_size, max_size,
+                                mask_s, mask_l)
+            else:
+                cut = _find_cut_numpy(buffer, zeros, pos, len(buffer), min_size, avg_size,
+                                      max_size, mask_s, mask_l)
+            yield offset + pos, bytes(buffer[pos:cut])
+            pos = cut
+        del buffer[:pos]
+        offset += pos
+
+
+def chunk_fileobj(fileobj, hash_cls, *, min_size=_MIN_SIZE, avg_size=_AVG_SIZE,
+                  max_size=_MAX_SIZE, workers=None, **kwargs):
+    """Yield (offset, length, digest) of content-defined chunks of data from file object.
+
+    If workers is nonzero, the chunks are hashed on that many threads.
+    """
+
+    chunks = iter_chunks(fileobj, min_size=min_size, avg_size=avg_size, max_size=max_size)
+    func = functools.partial(hash_cls.hash, **kwargs)
+
+    if not workers:
+        for offset, chunk in chunks:
+            yield offset, len(chunk), func(chunk)
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        batch = []
+        batch_size = workers * 16
+        for item in chunks:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield from _hash_batch(pool, func, batch)
+                batch = []
+        yield from _hash_batch(pool, func, batch)
+
+
+def _hash_batch(pool, func, batch):
+    digests = pool.map(func, [chunk for _, chunk in batch])
+    for (offset, chunk), digest in zip(batch, digests):
+        yield offset, len(chunk), digest
+
+
+def chunk_file(filepath, hash_cls, **kwargs):
+    """Return list of (offset, length, digest) of content-defined chunks of data from file."""
+
+    with open(filepath, 'rb') as f:
+        return list(chunk_fileobj(f, hash_cls, **kwargs))
@@ -0,0 +1,106 @@
+"""Resumable, checkpointed hashing of huge and append-only files.
+
+The file is split into leaves of `leaf_size` bytes, and the digest is a two-level tree
+hash: the hash of the concatenated leaf digests followed by the file size as 8 bytes
+big-endian. The digests of complete leaves are persisted to a sidecar file as hashing
+goes, so an interrupted run continues from the last checkpoint, and data appended to the
+file only costs the new bytes plus the trailing partial leaf.
+
+Note the tree digest differs from the plain digest of the file.
+"""
+
+import os
+
+from xycrypto import _fs, tuning
+
+__all__ = ['hash_file_resumable']
+
+_LEAF_SIZE = 0x1000000
+_LEAVES_PER_CHECKPOINT = 16
+_SUFFIX = '.xyckpt'
+
+
+def _load(checkpoint, algorithm, leaf_size):
+    # A missing, stale or damaged checkpoint is ignored, and hashing starts over.
+    state = _fs.load_json(checkpoint)
+    if state is None or state.get('algorithm') != algorithm \
+            or state.get('leaf_size') != leaf_size:
+        return []
+    leaves = state.get('leaves')
+    digest_size = state.get('digest_size')
+    if not (isinstance(leaves, str) and isinstance(digest_size, int) and digest_size >= 1):
+        return []
+    try:
+        data = bytes.fromhex(leaves)
+    except ValueError:
+        return []
+    if len(data) % digest_size:
+        return []
+    return [data[i:i + digest_size] for i in range(0, len(data), digest_size)]
+
+
+def _save(checkpoint, algorithm, leaf_size, leaves):
+    state = {
+        'algorithm': algorithm,
+        'leaf_size': leaf_size,
+        'digest_size': len(leaves[0]) if leaves else 0,
+        'leaves': b''.join(leaves).hex()
+    }
+    _fs.save_json(checkpoint, state)
+
+
+def _hash_leaf(new, f, size, buffer_size):
+    ctx = new()
+    while size > 0:
+        chunk = f.read(min(size, buffer_size))
+        if not chunk:
+            break
+        ctx.update(chunk)
+        size -= len(chunk)
+    return ctx.finalize()
+
+
+def hash_file_resumable(new, algorithm, filepath, checkpoint=None,
+                        leaf_size=_LEAF_SIZE, buffer_size=None):
+    """Return tree hash of data from file, resuming from and updating the checkpoint.
+
+    The new returns a fresh hash context, and algorithm names it in the checkpoint; a
+    checkpoint of another algorithm or leaf size is ignored. The checkpoint defaults to
+    filepath with suffix '.xyckpt'. The file is assumed to be append-only: the last
+    checkpointed leaf is hashed again, and if it changed, hashing starts over.
+    """
+
+    if checkpoint is None:
+        checkpoint = os.fspath(filepath) + _SUFFIX
+    if buffer_size is None:
+        buffer_size = tuning.buffer_size()
+
+    leaves = _load(checkpoint, algorithm, leaf_size)
+    with open(filepath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if len(leaves) * leaf_size > size:
+            leaves = []
+        elif leaves:
+            f.seek((len(leaves) - 1) * leaf_size)
+            if _hash_leaf(new, f, leaf_size, buffer_size) != leaves[-1]:
+                leaves = []
+        f.seek(len(leaves) * leaf_size)
+
+        saved = len(leaves)
+        for _ in range(len(leaves), size // leaf_size):
+            leaves.append(_hash_leaf(new, f, leaf_size, buffer_size))
+            if len(leaves) - saved >= _LEAVES_PER_CHECKPOINT:
+                _save(checkpoint, algorithm, leaf_size, leaves)
+                saved = len(leaves)
+        if len(leaves) != saved:
+            _save(checkpoint, algorithm, leaf_size, leaves)
+
+        tail = []
+        if size % leaf_size:
+            tail.append(_hash_leaf(new, f, size % leaf_size, buffer_size))
+
+    ctx = new()
+    for digest in leaves + tail:
+        ctx.update(digest)
+    ctx.update(size.to_bytes(8, 'big'))
+    return ctx.finalize()
@@ -1,8 +1,11 @@
 from ._core_stream import (     # NOQA; isort:skip
     ChaCha20, RC4
 )
+from ._core_aead import (       # NOQA; isort:skip
+    AES_GCM, ChaCha20Poly1305
+)
 from ._core_block import (      # NOQA; isort:skip
-    AES, AES_ECB, AES_CBC, AES_CFB, AES_OFB, AES_CTR,
+    AES, AES_ECB, AES_CBC, AES_CFB, AES_OFB, AES_CTR, AES_XTS,
     Blowfish, Blowfish_ECB, Blowfish_CBC, Blowfish_CFB, Blowfish_OFB,
     Camellia, Camellia_ECB, Camellia_CBC, Camellia_CFB, Camellia_OFB, Camellia_CTR,
     CAST5, CAST5_ECB, CAST5_CBC, CAST5_CFB, CAST5_OFB,
@@ -13,7 +16,8 @@ from ._core_block import (      # NOQA; isort:skip
 
 __all__ = [
     'ARC4', 'ChaCha20', 'RC4',
-    'AES', 'AES_ECB', 'AES_CBC', 'AES_CFB', 'AES_OFB', 'AES_CTR',
+    'AES_GCM', 'ChaCha20Poly1305',
+    'AES', 'AES_ECB', 'AES_CBC', 'AES_CFB', 'AES_OFB', 'AES_CTR', 'AES_XTS',
     'Blowfish', 'Blowfish_ECB', 'Blowfish_CBC', 'Blowfish_CFB', 'Blowfish_OFB',
     'Camellia', 'Camellia_ECB', 'Camellia_CBC', 'Camellia_CFB', 'Camellia_OFB', 'Camellia_CTR',
     'CAST5', 'CAST5_ECB', 'CAST5_CBC', 'CAST5_CFB', 'CAST5_OFB',
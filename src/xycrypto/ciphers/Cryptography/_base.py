@@ -1,10 +1,22 @@
 import abc
+import concurrent.futures
+import mmap
+import os
+import weakref
 
+from xycrypto import rand, tuning
 from xycrypto.ciphers import base, utils
 
 from . import _lib
 
 
+def _shallow_copy(obj):
+    # Cheaper than `copy.copy`, which goes through `__reduce_ex__`.
+    other = object.__new__(type(obj))
+    other.__dict__.update(obj.__dict__)
+    return other
+
+
 @base.Cipher.register
 class Cipher(metaclass=abc.ABCMeta):
     """Abstract base class for cipher."""
@@ -48,6 +60,54 @@ class Cipher(metaclass=abc.ABCMeta):
         temp = decryptor.update(data)
         return temp + decryptor.finalize()
 
+    def encrypt_fileobj(self, src, dst, *, buffers=0, buffer_size=None):
+        """Encrypt data from src file object and write encrypted data to dst file object.
+
+        If buffers is nonzero, a background thread reads ahead into that many buffers.
+        """
+
+        utils.transform_fileobj(self.encryptor(), src, dst, buffers, buffer_size)
+
+    def decrypt_fileobj(self, src, dst, *, buffers=0, buffer_size=None):
+        """Decrypt data from src file object and write decrypted data to dst file object.
+
+        If buffers is nonzero, a background thread reads ahead into that many buffers.
+        """
+
+        utils.transform_fileobj(self.decryptor(), src, dst, buffers, buffer_size)
+
+    def encrypt_file(self, src, dst, *, buffers=0, buffer_size=None):
+        """Encrypt data from src file and write encrypted data to dst file."""
+
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            self.encrypt_fileobj(fsrc, fdst, buffers=buffers, buffer_size=buffer_size)
+
+    def decrypt_file(self, src, dst, *, buffers=0, buffer_size=None):
+        """Decrypt data from src file and write decrypted data to dst file."""
+
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            self.decrypt_fileobj(fsrc, fdst, buffers=buffers, buffer_size=buffer_size)
+
+    def encrypt_file_inplace(self, filepath, *, buffer_size=None):
+        """Encrypt file in place."""
+
+        self._check_inplace(filepath)
+        utils.transform_file_inplace(self._cipher, self.encryptor(), filepath, buffer_size)
+
+    def decrypt_file_inplace(self, filepath, *, buffer_size=None):
+        """Decrypt file in place."""
+
+        self._check_inplace(filepath)
+        utils.transform_file_inplace(self._cipher, self.decryptor(), filepath, buffer_size)
+
+    def _check_inplace(self, filepath):
+        """Check that the file can be transformed in place."""
+
+    def _rebind(self, **kwargs):
+        """Return a copy of the cipher with new iv, nonce or tweak, reusing the key setup."""
+
+        return self
+
 
 @base.StreamCipher.register
 class StreamCipher(Cipher):
@@ -78,8 +138,22 @@ class BlockCipher(Cipher):
 
         return self._cipher.mode.name
 
+    @classmethod
+    def generate_iv(cls):
+        """Return a random iv of block size."""
+
+        return rand.urandom(cls.block_size)
+
+    @classmethod
+    def generate_nonce(cls):
+        """Return a random nonce of block size."""
+
+        return rand.urandom(cls.block_size)
+
     def __init__(self, key, mode, **kwargs):
         mode = _lib.create_mode(mode, **kwargs)
+        if mode.name == 'XTS':
+            raise ValueError('XTS mode requires the sector-addressed class, such as AES_XTS')
 
         # For ECB and CBC modes, the default padding is PKCS7.
         # For other modes, padding will not be added automatically.
@@ -98,6 +172,39 @@ class BlockCipher(Cipher):
     def decryptor(self):
         return utils.determine_decryptor(self._cipher, self._padding)
 
+    def _check_inplace(self, filepath):
+        if self._padding is not None:
+            raise ValueError('in-place transform requires padding=None')
+
+        if self.mode_name in {'ECB', 'CBC'}:
+            size = os.path.getsize(filepath)
+            if size % self.block_size != 0:
+                raise ValueError('require file size % {} == 0'.format(self.block_size))
+
+    def encrypt(self, data):
+        return utils.encrypt_padded(self._cipher, self._padding, data)
+
+    def decrypt(self, data):
+        return utils.decrypt_padded(self._cipher, self._padding, data)
+
+    def _rebind(self, **kwargs):
+        mode = _lib.bind_mode(type(self._cipher.mode), kwargs)
+        mode.validate_for_algorithm(self._cipher.algorithm)
+        return self._bind(mode)
+
+    def _bind(self, mode):
+        # The algorithm was checked when the cipher was prepared, so skip constructing
+        # `Cipher` again, which would check it for every request.
+        other = _shallow_copy(self)
+        cipher = other._cipher = _shallow_copy(self._cipher)
+        cipher.mode = mode
+        return other
+
+    def _bind_iv(self, mode_cls, iv, name='iv'):
+        if len(iv) != self.block_size:
+            raise ValueError('{} must be {} bytes, got {}'.format(name, self.block_size, len(iv)))
+        return self._bind(mode_cls(iv))
+
 
 @base.BlockCipherECB.register
 class BlockCipherECB(BlockCipher):
@@ -109,6 +216,9 @@ class BlockCipherECB(BlockCipher):
         self._cipher = _lib.Cipher(self._algorithm(key), _lib.ECB(), _lib.backend)
         self._padding = utils.determine_padding(padding, self.block_size)
 
+    def _rebind(self):
+        return self
+
 
 @base.BlockCipherCBC.register
 class BlockCipherCBC(BlockCipher):
@@ -120,6 +230,9 @@ class BlockCipherCBC(BlockCipher):
         self._cipher = _lib.Cipher(self._algorithm(key), _lib.CBC(iv), _lib.backend)
         self._padding = utils.determine_padding(padding, self.block_size)
 
+    def _rebind(self, *, iv):
+        return self._bind_iv(_lib.CBC, iv)
+
 
 @base.BlockCipherCFB.register
 class BlockCipherCFB(BlockCipher):
@@ -131,6 +244,9 @@ class BlockCipherCFB(BlockCipher):
         self._cipher = _lib.Cipher(self._algorithm(key), _lib.CFB(iv), _lib.backend)
         self._padding = utils.determine_padding(padding, self.block_size)
 
+    def _rebind(self, *, iv):
+        return self._bind_iv(_lib.CFB, iv)
+
 
 @base.BlockCipherOFB.register
 class BlockCipherOFB(BlockCipher):
@@ -142,6 +258,9 @@ class BlockCipherOFB(BlockCipher):
         self._cipher = _lib.Cipher(self._algorithm(key), _lib.OFB(iv), _lib.backend)
         self._padding = utils.determine_padding(padding, self.block_size)
 
+    def _rebind(self, *, iv):
+        return self._bind_iv(_lib.OFB, iv)
+
 
 @base.BlockCipherCTR.register
 class BlockCipherCTR(BlockCipher):
@@ -152,3 +271,268 @@ class BlockCipherCTR(BlockCipher):
     def __init__(self, key, *, nonce, padding=None):
         self._cipher = _lib.Cipher(self._algorithm(key), _lib.CTR(nonce), _lib.backend)
         self._padding = utils.determine_padding(padding, self.block_size)
+
+    def _rebind(self, *, nonce):
+        return self._bind_iv(_lib.CTR, nonce, 'nonce')
+
+
+class _XTSContext(object):
+    """Context which transforms sectors as they fill up, and the short last one at finalize."""
+
+    __slots__ = ('_cipher', '_sector', '_encrypt', '_buffer')
+
+    def __init__(self, cipher, sector, encrypt):
+        self._cipher = cipher
+        self._sector = sector
+        self._encrypt = encrypt
+        self._buffer = bytearray()
+
+    def update(self, data):
+        self._buffer += data
+        size = self._cipher._sector_size
+        n = len(self._buffer) // size * size
+        if n == 0:
+            return b''
+
+        result = bytearray(n)
+        with memoryview(self._buffer) as src, memoryview(result) as dst:
+            self._cipher._transform_into(src[:n], dst, self._sector, self._encrypt)
+        del self._buffer[:n]
+        self._sector += n // size
+        return bytes(result)
+
+    def finalize(self):
+        data = bytes(self._buffer)
+        del self._buffer[:]
+        if not data:
+            return b''
+        return self._cipher._transform_sector(data, self._sector, self._encrypt)
+
+
+@base.BlockCipherXTS.register
+class BlockCipherXTS(BlockCipher):
+    """Abstract base class for block cipher in XTS mode.
+
+    Data is encrypted in sectors of sector_size bytes, and the tweak of sector n is n in 16
+    bytes little-endian. The tweak gives the first sector, 0 if omitted. Every path, the
+    one-shot `encrypt`, the contexts and the file methods, runs over consecutive sectors
+    from there, so no tweak is used twice. The last sector may be short, but not shorter
+    than 16 bytes.
+
+    The worker threads of `encrypt_sectors` are released by `close`, or when the cipher is
+    garbage collected.
+    """
+
+    mode_name = 'XTS'
+
+    def __init__(self, key, *, tweak=None, sector_size=0x1000, padding=None, workers=None):
+        if padding is not None:
+            raise ValueError('XTS mode is length-preserving, padding must be None')
+        if sector_size < 16:
+            raise ValueError('sector_size must be >= 16, got {}'.format(sector_size))
+        if tweak is None:
+            tweak = bytes(16)
+
+        self._cipher = _lib.Cipher(self._algorithm(key), _lib.XTS(tweak), _lib.backend)
+        self._padding = None
+        self._first_sector = int.from_bytes(tweak, 'little')
+        self._sector_size = sector_size
+        self._workers = workers or tuning.workers()
+        self._pool = None
+
+    def _rebind(self, *, tweak=None):
+        other = super()._rebind(tweak=bytes(16) if tweak is None else tweak)
+        other._first_sector = int.from_bytes(other._cipher.mode.tweak, 'little')
+        other._pool = None
+        return other
+
+    def encryptor(self):
+        return _XTSContext(self, self._first_sector, True)
+
+    def decryptor(self):
+        return _XTSContext(self, self._first_sector, False)
+
+    def encrypt(self, data):
+        return self._transform(data, self._first_sector, True)
+
+    def decrypt(self, data):
+        return self._transform(data, self._first_sector, False)
+
+    def encrypt_sector(self, data, sector):
+        """Encrypt data of one sector."""
+
+        return self._transform_sector(data, sector, True)
+
+    def decrypt_sector(self, data, sector):
+        """Decrypt data of one sector."""
+
+        return self._transform_sector(data, sector, False)
+
+    def encrypt_sectors(self, data, first_sector=0):
+        """Encrypt data of consecutive whole sectors, starting from first_sector."""
+
+        self._check_sectors(len(data))
+        return self._transform(data, first_sector, True)
+
+    def decrypt_sectors(self, data, first_sector=0):
+        """Decrypt data of consecutive whole sectors, starting from first_sector."""
+
+        self._check_sectors(len(data))
+        return self._transform(data, first_sector, False)
+
+    def encrypt_file_inplace(self, filepath, *, buffer_size=None):
+        self._transform_file_inplace(filepath, True, buffer_size)
+
+    def decrypt_file_inplace(self, filepath, *, buffer_size=None):
+        self._transform_file_inplace(filepath, False, buffer_size)
+
+    def close(self):
+        """Shut down the worker threads, which are started again if needed."""
+
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _check_sectors(self, size):
+        if size % self._sector_size != 0:
+            raise ValueError('require len(data) % {} == 0'.format(self._sector_size))
+
+    def _check_inplace(self, filepath):
+        rest = os.path.getsize(filepath) % self._sector_size
+        if 0 < rest < 16:
+            raise ValueError('require file size % {} == 0 or >= 16'.format(self._sector_size))
+
+    def _transform_sector(self, data, sector, encrypt):
+        # Only the tweak differs between sectors, so skip validating the key again.
+        cipher = _shallow_copy(self._cipher)
+        cipher.mode = _lib.XTS(sector.to_bytes(16, 'little'))
+        ctx = cipher.encryptor() if encrypt else cipher.decryptor()
+        temp = ctx.update(data)
+        ctx.finalize()
+        return temp
+
+    def _transform(self, data, first_sector, encrypt):
+        result = bytearray(len(data))
+        with memoryview(data) as src, memoryview(result) as dst:
+            self._transform_into(src, dst, first_sector, encrypt)
+        return bytes(result)
+
+    def _transform_into(self, src, dst, first_sector, encrypt):
+        """Transform src into dst of the same length, which may be the same memory."""
+
+        size = self._sector_size
+        count = -(-len(src) // size)
+
+        def transform(batch):
+            for i in batch:
+                begin = i * size
+                end = begin + size
+                dst[begin:end] = self._transform_sector(src[begin:end], first_sector + i, encrypt)
+
+        batch_size = max(-(-count // (self._workers * 4)), 1)
+        batches = [range(i, min(i + batch_size, count)) for i in range(0, count, batch_size)]
+        if self._workers < 2 or len(batches) < 2:
+            for batch in batches:
+                transform(batch)
+            return
+
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(self._workers)
+            weakref.finalize(self, self._pool.shutdown, wait=False)
+        for _ in self._pool.map(transform, batches):
+            pass
+
+    def _transform_file_inplace(self, filepath, encrypt, buffer_size):
+        self._check_inplace(filepath)
+        if buffer_size is None:
+            buffer_size = tuning.buffer_size()
+        with open(filepath, 'r+b') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:   # empty file can not be mapped
+                return
+
+            span = max(buffer_size // self._sector_size, 1) * self._sector_size
+            with mmap.mmap(f.fileno(), size) as mm, memoryview(mm) as view:
+                for offset in range(0, size, span):
+                    with view[offset:offset + span] as part:
+                        sector = self._first_sector + offset // self._sector_size
+                        self._transform_into(part, part, sector, encrypt)
+
+
+@base.AEADCipher.register
+class AEADCipher(Cipher):
+    """Abstract base class for authenticated encryption with associated data.
+
+    The `encrypt` and `decrypt` methods are the standard one-shot AEAD, where the tag is
+    appended to the ciphertext. The encryptor and decryptor contexts use a chunked streaming
+    construction instead, so that data larger than memory can be sealed and opened in a single
+    pass, with chunks processed on `workers` threads. Each chunk of `chunk_size` bytes is
+    authenticated before its plaintext is returned.
+    """
+
+    nonce_size = 12
+    tag_size = 16
+
+    def __init__(self, key, *, nonce, chunk_size=0x10000, workers=None):
+        if len(nonce) != self.nonce_size:
+            raise ValueError(
+                'nonce must be {} bytes, got {}'.format(self.nonce_size, len(nonce))
+            )
+
+        self._aead = self._algorithm(key)
+        self._key_size = len(key)
+        self._nonce = nonce
+        self._chunk_size = chunk_size
+        self._workers = workers
+
+    @property
+    def key_size(self):
+        return self._key_size
+
+    @classmethod
+    def generate_nonce(cls):
+        """Return a random nonce of nonce size."""
+
+        return rand.urandom(cls.nonce_size)
+
+    def encryptor(self, associated_data=None):
+        return utils.AEADEncryptor(
+            self._aead.encrypt, self._nonce, associated_data, self._chunk_size, self._workers
+        )
+
+    def decryptor(self, associated_data=None):
+        return utils.AEADDecryptor(
+            self._open, self._nonce, associated_data, self._chunk_size, self._workers,
+            self.tag_size
+        )
+
+    def encrypt(self, data, associated_data=None):
+        return self._aead.encrypt(self._nonce, data, associated_data)
+
+    def decrypt(self, data, associated_data=None):
+        return self._open(self._nonce, data, associated_data)
+
+    def _rebind(self, *, nonce):
+        if len(nonce) != self.nonce_size:
+            raise ValueError(
+                'nonce must be {} bytes, got {}'.format(self.nonce_size, len(nonce))
+            )
+
+        other = _shallow_copy(self)
+        other._nonce = nonce
+        return other
+
+    def _open(self, nonce, data, associated_data):
+        try:
+            return self._aead.decrypt(nonce, data, associated_data)
+        except _lib.InvalidTag:
+            raise ValueError('invalid tag') from None
+
+    def _check_inplace(self, filepath):
+        raise ValueError('in-place transform requires a length-preserving cipher')
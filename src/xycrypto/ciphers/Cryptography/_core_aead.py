@@ -0,0 +1,15 @@
+from . import _base, _lib
+
+
+class AES_GCM(_base.AEADCipher):
+    _algorithm = _lib.AESGCM
+    name = 'AES'
+    mode_name = 'GCM'
+    block_size = 16
+    key_sizes = frozenset([16, 24, 32])
+
+
+class ChaCha20Poly1305(_base.AEADCipher):
+    _algorithm = _lib.ChaCha20Poly1305
+    name = 'ChaCha20Poly1305'
+    key_sizes = frozenset([32])
@@ -31,6 +31,10 @@ class AES_CTR(_base.BlockCipherCTR, AES):
     pass
 
 
+class AES_XTS(_base.BlockCipherXTS, AES):
+    key_sizes = frozenset([32, 64])
+
+
 # Blowfish
 
 
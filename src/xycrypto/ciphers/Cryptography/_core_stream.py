@@ -1,3 +1,5 @@
+from xycrypto import rand
+
 from . import _base, _lib
 
 
@@ -5,10 +7,23 @@ class ChaCha20(_base.StreamCipher):
     _algorithm = _lib.ChaCha20
     name = 'ChaCha20'
     key_sizes = frozenset([32])
+    nonce_size = 16
 
     def __init__(self, key, *, nonce):
         self._cipher = _lib.Cipher(self._algorithm(key, nonce), None, _lib.backend)
 
+    @classmethod
+    def generate_nonce(cls):
+        """Return a random nonce of nonce size."""
+
+        return rand.urandom(cls.nonce_size)
+
+    def _rebind(self, *, nonce):
+        other = _base._shallow_copy(self)
+        algorithm = self._algorithm(self._cipher.algorithm.key, nonce)
+        other._cipher = _lib.Cipher(algorithm, None, _lib.backend)
+        return other
+
 
 class RC4(_base.StreamCipher):
     _algorithm = _lib.ARC4
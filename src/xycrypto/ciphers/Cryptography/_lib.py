@@ -1,14 +1,19 @@
+import functools
 import inspect
 
+from cryptography.exceptions import InvalidTag                          # NOQA; isort:skip
 from cryptography.hazmat.backends import default_backend                # NOQA; isort:skip
 from cryptography.hazmat.primitives.ciphers import Cipher               # NOQA; isort:skip
+from cryptography.hazmat.primitives.ciphers.aead import (               # NOQA; isort:skip
+    AESGCM, ChaCha20Poly1305
+)
 from cryptography.hazmat.primitives.ciphers.algorithms import (         # NOQA; isort:skip
     ARC4, ChaCha20,
     AES, Blowfish, Camellia, CAST5, IDEA, SEED, TripleDES
 )
 from cryptography.hazmat.primitives.ciphers.modes import (              # NOQA; isort:skip
-    ECB, CBC, CFB, OFB, CTR,
-    Mode, ModeWithInitializationVector, ModeWithNonce
+    ECB, CBC, CFB, OFB, CTR, XTS,
+    Mode, ModeWithInitializationVector, ModeWithNonce, ModeWithTweak
 )
 
 backend = default_backend()
@@ -18,38 +23,52 @@ _MODE_REGISTRY = {
     'CBC': CBC,
     'CFB': CFB,
     'OFB': OFB,
-    'CTR': CTR
+    'CTR': CTR,
+    'XTS': XTS
 }
 
 
 def lookup_mode(mode):
-    if inspect.isclass(mode) and issubclass(mode, Mode):
-        return mode
-
     if isinstance(mode, str):
         try:
             return _MODE_REGISTRY[mode.upper()]
         except KeyError:
             pass
 
+    if inspect.isclass(mode) and issubclass(mode, Mode):
+        return mode
+
     raise ValueError(
         'mode must be in {}, got {}'.format(set(_MODE_REGISTRY), mode)
     )
 
 
-def create_mode(mode, **kwargs):
-    mode = lookup_mode(mode)
+@functools.lru_cache(maxsize=None)
+def _mode_args(mode):
+    """Return the names of arguments required by mode class, in positional order."""
 
-    args = {}
+    names = []
     if issubclass(mode, ModeWithInitializationVector):
-        try:
-            args['initialization_vector'] = kwargs['iv']
-        except KeyError:
-            raise TypeError('missing required keyword-only argument: "iv"')
+        names.append('iv')
     if issubclass(mode, ModeWithNonce):
+        names.append('nonce')
+    if issubclass(mode, ModeWithTweak):
+        names.append('tweak')
+    return tuple(names)
+
+
+def create_mode(mode, **kwargs):
+    return bind_mode(lookup_mode(mode), kwargs)
+
+
+def bind_mode(mode, kwargs):
+    """Return instance of mode class with its arguments taken from kwargs."""
+
+    args = []
+    for name in _mode_args(mode):
         try:
-            args['nonce'] = kwargs['nonce']
+            args.append(kwargs[name])
         except KeyError:
-            raise TypeError('missing required keyword-only argument: "nonce"')
+            raise TypeError('missing required keyword-only argument: "{}"'.format(name))
 
-    return mode(**args)
+    return mode(*args)
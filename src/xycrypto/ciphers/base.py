@@ -47,3 +47,11 @@ class BlockCipherOFB(BlockCipher):
 
 class BlockCipherCTR(BlockCipher):
     """Abstract base class for block cipher in CTR mode."""
+
+
+class BlockCipherXTS(BlockCipher):
+    """Abstract base class for block cipher in XTS mode."""
+
+
+class AEADCipher(Cipher):
+    """Abstract base class for authenticated encryption with associated data."""
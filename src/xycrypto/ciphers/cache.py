@@ -0,0 +1,48 @@
+"""Cache of prepared ciphers for services which encrypt under many keys."""
+
+from xycrypto._cache import TTLCache
+
+__all__ = ['CipherCache']
+
+
+class CipherCache(TTLCache):
+    """Thread-safe LRU cache of prepared ciphers keyed by (class, key, options).
+
+    The options are the constructor arguments other than iv, nonce and tweak, such as
+    padding, chunk_size, workers or sector_size; they must be hashable. The cached cipher
+    keeps its key setup and options; every request gets a copy bound to its own iv, nonce or
+    tweak, so contexts are never shared between requests. The cached ciphers hold their keys
+    in memory until evicted or cleared.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        super().__init__(maxsize, ttl)
+
+    def cipher(self, cipher_cls, key, *, iv=None, nonce=None, tweak=None, **options):
+        """Return cipher of cipher_cls for key and options, bound to iv, nonce or tweak."""
+
+        bind = {}
+        if iv is not None:
+            bind['iv'] = iv
+        if nonce is not None:
+            bind['nonce'] = nonce
+        if tweak is not None:
+            bind['tweak'] = tweak
+
+        cache_key = (cipher_cls, key, tuple(sorted(options.items()))) if options \
+            else (cipher_cls, key)
+        prepared = self.get(cache_key)
+        if prepared is None:
+            prepared = cipher_cls(key, **options, **bind)
+            self.put(cache_key, prepared)
+        return prepared._rebind(**bind)
+
+    def encryptor(self, cipher_cls, key, **kwargs):
+        """Return the encryptor context of cipher. See `cipher`."""
+
+        return self.cipher(cipher_cls, key, **kwargs).encryptor()
+
+    def decryptor(self, cipher_cls, key, **kwargs):
+        """Return the decryptor context of cipher. See `cipher`."""
+
+        return self.cipher(cipher_cls, key, **kwargs).decryptor()
@@ -0,0 +1,151 @@
+"""Authenticated encryption composed from a cipher and HMAC."""
+
+import os
+
+from xycrypto import tuning
+from xycrypto.ciphers import base, utils
+from xycrypto.hmac import HMAC, compare_digest
+
+__all__ = ['EncryptThenMAC']
+
+
+class _EncryptThenMACEncryptor(object):
+    __slots__ = ('_ctx', '_mac')
+
+    def __init__(self, ctx, mac):
+        self._ctx = ctx
+        self._mac = mac
+
+    def update(self, data):
+        temp = self._ctx.update(data)
+        self._mac.update(temp)
+        return temp
+
+    def finalize(self):
+        temp = self._ctx.finalize()
+        self._mac.update(temp)
+        return temp + self._mac.finalize()
+
+
+class _EncryptThenMACDecryptor(object):
+    __slots__ = ('_ctx', '_mac', '_tag_size', '_buffer')
+
+    def __init__(self, ctx, mac, tag_size):
+        self._ctx = ctx
+        self._mac = mac
+        self._tag_size = tag_size
+        self._buffer = bytearray()
+
+    def update(self, data):
+        # The last tag_size bytes seen so far may be the tag, so hold them back.
+        self._buffer += data
+        n = len(self._buffer) - self._tag_size
+        if n <= 0:
+            return b''
+
+        with memoryview(self._buffer) as view:
+            self._mac.update(view[:n])
+            temp = self._ctx.update(view[:n])
+        del self._buffer[:n]
+        return temp
+
+    def finalize(self):
+        if len(self._buffer) != self._tag_size:
+            raise ValueError('incomplete tag')
+        if not self._mac.verify(bytes(self._buffer)):
+            raise ValueError('invalid tag')
+        return self._ctx.finalize()
+
+
+@base.Cipher.register
+class EncryptThenMAC(object):
+    """Encrypt-then-MAC composite of cipher class and HMAC of hash class.
+
+    The keyword arguments, such as iv, nonce and padding, are passed to the cipher class. The
+    tag is the HMAC of the iv or nonce followed by the ciphertext, and is appended to the
+    ciphertext. Every chunk of ciphertext is fed to HMAC as it leaves the encryptor, or as it
+    enters the decryptor, so the data is touched once while it is in cache.
+
+    The one-shot `decrypt` returns nothing unless the tag is valid. The decryptor context
+    returns plaintext before the tag is checked by `finalize`, which raises if it is invalid;
+    callers must discard the plaintext then.
+    """
+
+    def __init__(self, cipher_cls, hash_cls, enc_key, mac_key, **kwargs):
+        self._cipher = cipher_cls(enc_key, **kwargs)
+        self._mac = HMAC(hash_cls, mac_key)
+        self._mac.update(kwargs.get('iv') or kwargs.get('nonce') or b'')
+        self.tag_size = self._mac.digest_size
+
+    def encryptor(self):
+        return _EncryptThenMACEncryptor(self._cipher.encryptor(), self._mac.copy())
+
+    def decryptor(self):
+        return _EncryptThenMACDecryptor(
+            self._cipher.decryptor(), self._mac.copy(), self.tag_size
+        )
+
+    def encrypt(self, data):
+        """Encrypt data and return encrypted data followed by the tag."""
+
+        ctx = self.encryptor()
+        chunk_size = tuning.buffer_size()
+        with memoryview(data) as view:
+            parts = [ctx.update(view[i:i + chunk_size])
+                     for i in range(0, len(view), chunk_size)]
+        parts.append(ctx.finalize())
+        return b''.join(parts)
+
+    def decrypt(self, data):
+        """Check the tag, decrypt data and return decrypted data."""
+
+        if len(data) < self.tag_size:
+            raise ValueError('incomplete tag')
+
+        ctx = self._cipher.decryptor()
+        mac = self._mac.copy()
+        size = len(data) - self.tag_size
+        chunk_size = tuning.buffer_size()
+        with memoryview(data) as view:
+            parts = []
+            for i in range(0, size, chunk_size):
+                chunk = view[i:min(i + chunk_size, size)]
+                mac.update(chunk)
+                parts.append(ctx.update(chunk))
+            if not compare_digest(mac.finalize(), view[size:]):
+                raise ValueError('invalid tag')
+        parts.append(ctx.finalize())
+        return b''.join(parts)
+
+    def encrypt_fileobj(self, src, dst, *, buffers=0, buffer_size=None):
+        """Encrypt data from src file object and write encrypted data and tag to dst."""
+
+        utils.transform_fileobj(self.encryptor(), src, dst, buffers, buffer_size)
+
+    def decrypt_fileobj(self, src, dst, *, buffers=0, buffer_size=None):
+        """Decrypt data from src file object and write decrypted data to dst.
+
+        The tag is checked at the end; if it is invalid, ValueError is raised and the data
+        written to dst must be discarded.
+        """
+
+        utils.transform_fileobj(self.decryptor(), src, dst, buffers, buffer_size)
+
+    def encrypt_file(self, src, dst, *, buffers=0, buffer_size=None):
+        """Encrypt data from src file and write encrypted data and tag to dst file."""
+
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            self.encrypt_fileobj(fsrc, fdst, buffers=buffers, buffer_size=buffer_size)
+
+    def decrypt_file(self, src, dst, *, buffers=0, buffer_size=None):
+        """Decrypt data from src file and write decrypted data to dst file.
+
+        If the tag is invalid, ValueError is raised and dst is removed.
+        """
+
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                self.decrypt_fileobj(fsrc, fdst, buffers=buffers, buffer_size=buffer_size)
+        except ValueError:
+            os.remove(dst)
+            raise
@@ -0,0 +1,224 @@
+"""Chunked, seekable container of encrypted data.
+
+Layout of the container::
+
+    header | chunk 0 | chunk 1 | ... | index | trailer
+
+Every chunk holds `chunk_size` bytes of plaintext (the last one may hold less), encrypted
+independently with its own random iv or nonce. The index stores the iv or nonce and the
+encrypted size of every chunk, and the fixed-size trailer locates the index. Offsets are
+relative to the header, so a container may start anywhere in a file and must run to its end.
+
+Note the container provides confidentiality only; it does not authenticate the data.
+"""
+
+import concurrent.futures
+import inspect
+import io
+import struct
+
+from xycrypto import rand, tuning
+
+__all__ = ['ContainerWriter', 'ContainerReader']
+
+_MAGIC = b'XYCRYPTC'
+_HEADER = _MAGIC + b'\x01'
+_TRAILER = struct.Struct('<QQIB3x8s')   # index offset, size, chunk size, iv size, magic
+_LENGTH = struct.Struct('<I')
+
+# The chunk size is part of the format, stored in the trailer, so it is not tuned.
+_CHUNK_SIZE = 0x10000
+_CHUNKS_PER_WORKER = 4
+
+
+def _iv_spec(cipher_cls):
+    """Return the name and size of the iv or nonce argument of cipher class."""
+
+    params = inspect.signature(cipher_cls).parameters
+    for name in ('iv', 'nonce'):
+        if name in params:
+            size = getattr(cipher_cls, 'nonce_size', None) or getattr(cipher_cls, 'block_size', 16)
+            return name, size
+    raise ValueError('{} takes neither iv nor nonce'.format(cipher_cls.__name__))
+
+
+class ContainerWriter(io.RawIOBase):
+    """Write plaintext and store it as a chunked, seekable container of encrypted data."""
+
+    def __init__(self, fileobj, cipher_cls, key, *,
+                 chunk_size=_CHUNK_SIZE, workers=None, **kwargs):
+        if chunk_size < 1 or chunk_size > 0xFFFFFFFF:
+            raise ValueError('chunk_size must be in [1, 4294967295], got {}'.format(chunk_size))
+
+        self._fileobj = fileobj
+        self._cipher_cls = cipher_cls
+        self._key = key
+        self._kwargs = kwargs
+        self._iv_name, self._iv_size = _iv_spec(cipher_cls)
+        self._chunk_size = chunk_size
+
+        workers = workers or tuning.workers()
+        self._pool = concurrent.futures.ThreadPoolExecutor(workers) if workers > 1 else None
+        self._batch_size = chunk_size * workers * _CHUNKS_PER_WORKER
+
+        self._buffer = bytearray()
+        self._size = 0
+        self._index = []
+        self._start = fileobj.tell()
+        fileobj.write(_HEADER)
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        if self.closed:
+            raise ValueError('write to closed container')
+
+        self._buffer += b
+        if len(self._buffer) >= self._batch_size:
+            n = len(self._buffer) - len(self._buffer) % self._chunk_size
+            self._flush_chunks(n)
+        return len(b)
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            self._flush_chunks(len(self._buffer))
+            index_offset = self._fileobj.tell() - self._start
+            self._fileobj.write(b''.join(self._index))
+            self._fileobj.write(_TRAILER.pack(
+                index_offset, self._size, self._chunk_size, self._iv_size, _MAGIC
+            ))
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+            super().close()
+
+    def _encrypt_chunk(self, args):
+        iv, chunk = args
+        kwargs = dict(self._kwargs)
+        kwargs[self._iv_name] = iv
+        return self._cipher_cls(self._key, **kwargs).encrypt(chunk)
+
+    def _flush_chunks(self, n):
+        chunk_size = self._chunk_size
+        with memoryview(self._buffer) as view:
+            chunks = [
+                (rand.urandom(self._iv_size), bytes(view[i:i + chunk_size]))
+                for i in range(0, n, chunk_size)
+            ]
+        del self._buffer[:n]
+        self._size += n
+
+        if self._pool is None or len(chunks) == 1:
+            results = map(self._encrypt_chunk, chunks)
+        else:
+            results = self._pool.map(self._encrypt_chunk, chunks)
+        for (iv, _), encrypted in zip(chunks, results):
+            self._fileobj.write(encrypted)
+            self._index.append(iv + _LENGTH.pack(len(encrypted)))
+
+
+class ContainerReader(io.RawIOBase):
+    """Read plaintext from a chunked container, decrypting only the chunks it touches."""
+
+    def __init__(self, fileobj, cipher_cls, key, **kwargs):
+        self._fileobj = fileobj
+        self._cipher_cls = cipher_cls
+        self._key = key
+        self._kwargs = kwargs
+        self._iv_name, iv_size = _iv_spec(cipher_cls)
+
+        start = fileobj.tell()
+        if fileobj.read(len(_HEADER)) != _HEADER:
+            raise ValueError('invalid container header')
+
+        fileobj.seek(-_TRAILER.size, io.SEEK_END)
+        trailer_offset = fileobj.tell() - start
+        index_offset, size, chunk_size, stored_iv_size, magic = \
+            _TRAILER.unpack(fileobj.read(_TRAILER.size))
+        if magic != _MAGIC or stored_iv_size != iv_size:
+            raise ValueError('invalid container trailer')
+
+        if not len(_HEADER) <= index_offset <= trailer_offset:
+            raise ValueError('invalid container trailer')
+        fileobj.seek(start + index_offset)
+        index = fileobj.read(trailer_offset - index_offset)
+        entry_size = iv_size + _LENGTH.size
+        if len(index) % entry_size != 0:
+            raise ValueError('invalid container index')
+
+        self._ivs = []
+        self._offsets = []
+        offset = len(_HEADER)
+        for i in range(0, len(index), entry_size):
+            self._ivs.append(index[i:i + iv_size])
+            self._offsets.append(start + offset)
+            offset += _LENGTH.unpack_from(index, i + iv_size)[0]
+        self._offsets.append(start + offset)
+        if offset != index_offset or chunk_size < 1 or len(self._ivs) != -(-size // chunk_size):
+            raise ValueError('invalid container index')
+
+        self._size = size
+        self._chunk_size = chunk_size
+        self._pos = 0
+        self._cached = None, b''
+
+    @property
+    def size(self):
+        """The size of plaintext."""
+
+        return self._size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError('invalid whence {}'.format(whence))
+
+        if pos < 0:
+            raise ValueError('negative seek position {}'.format(pos))
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        with memoryview(b) as mv, mv.cast('B') as view:
+            total = 0
+            while total < len(view) and self._pos < self._size:
+                i, start = divmod(self._pos, self._chunk_size)
+                chunk = self._chunk(i)
+                n = min(len(chunk) - start, len(view) - total)
+                view[total:total + n] = chunk[start:start + n]
+                total += n
+                self._pos += n
+            return total
+
+    def _chunk(self, i):
+        if self._cached[0] != i:
+            begin, end = self._offsets[i], self._offsets[i + 1]
+            self._fileobj.seek(begin)
+            encrypted = self._fileobj.read(end - begin)
+
+            kwargs = dict(self._kwargs)
+            kwargs[self._iv_name] = self._ivs[i]
+            chunk = self._cipher_cls(self._key, **kwargs).decrypt(encrypted)
+            # Nothing here is authenticated, so check every chunk holds what the index says.
+            if len(chunk) != min(self._chunk_size, self._size - i * self._chunk_size):
+                raise ValueError('truncated or corrupt container')
+            self._cached = i, chunk
+        return self._cached[1]
@@ -1,4 +1,9 @@
-from xycrypto.padding import create_padding
+import concurrent.futures
+import mmap
+import os
+
+from xycrypto import _readahead, tuning
+from xycrypto.padding import _PaddingFramework, create_padding
 
 
 def determine_padding(padding, block_size):
@@ -8,6 +13,8 @@ def determine_padding(padding, block_size):
 
 
 class PaddingWrapper(object):
+    __slots__ = ('padded_ctx', 'padding_ctx')
+
     def __init__(self, padded_ctx, padding_ctx):
         self.padded_ctx = padded_ctx
         self.padding_ctx = padding_ctx
@@ -32,3 +39,149 @@ def determine_decryptor(cipher, padding):
     if padding is None:
         return decryptor
     return PaddingWrapper(padding.unpadder(), decryptor)
+
+
+def update_slack(cipher):
+    """Return the spare room that `update_into` requires in the output buffer."""
+
+    return getattr(cipher.algorithm, 'block_size', 8) // 8 - 1
+
+
+def encrypt_padded(cipher, padding, data):
+    """Pad and encrypt the whole data with a single `update` call."""
+
+    if not isinstance(padding, _PaddingFramework):
+        encryptor = determine_encryptor(cipher, padding)
+        temp = encryptor.update(data)
+        return temp + encryptor.finalize()
+
+    # Joining copies the data once, and takes any bytes-like object.
+    encryptor = cipher.encryptor()
+    temp = encryptor.update(b''.join((data, padding._padding(len(data)))))
+    encryptor.finalize()
+    return temp
+
+
+def decrypt_padded(cipher, padding, data):
+    """Decrypt and unpad the whole data without intermediate copies."""
+
+    if not isinstance(padding, _PaddingFramework):
+        decryptor = determine_decryptor(cipher, padding)
+        temp = decryptor.update(data)
+        return temp + decryptor.finalize()
+
+    decryptor = cipher.decryptor()
+    temp = decryptor.update(data)
+    decryptor.finalize()
+
+    with memoryview(temp) as view:
+        return bytes(view[:padding._unpadded_size(view)])
+
+
+def transform_file_inplace(cipher, ctx, filepath, buffer_size=None):
+    """Run the length-preserving cipher context over file through a memory map."""
+
+    if buffer_size is None:
+        buffer_size = tuning.buffer_size()
+    slack = update_slack(cipher)
+    with open(filepath, 'r+b') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:   # empty file can not be mapped
+            ctx.finalize()
+            return
+
+        with mmap.mmap(f.fileno(), size) as mm:
+            with memoryview(mm) as view:
+                for offset in range(0, size, buffer_size):
+                    end = min(offset + buffer_size, size)
+                    if size - end >= slack:
+                        n = ctx.update_into(view[offset:end], view[offset:])
+                    else:
+                        temp = ctx.update(view[offset:end])
+                        n = len(temp)
+                        view[offset:offset + n] = temp
+                    if n != end - offset:
+                        raise ValueError('cipher context is not length-preserving')
+            ctx.finalize()
+
+
+def transform_fileobj(ctx, src, dst, buffers=0, buffer_size=None):
+    """Run the cipher context over data from src and write the result to dst."""
+
+    for chunk in _readahead.iter_chunks(src, buffer_size, buffers):
+        dst.write(ctx.update(chunk))
+    dst.write(ctx.finalize())
+
+
+class _AEADStream(object):
+    """Chunked streaming AEAD construction.
+
+    The message is split into chunks of `chunk_size` bytes, and every chunk is sealed
+    separately. The nonce of chunk i is the base nonce XOR `(i << 8) | last`, where last is 1
+    for the final chunk only, so reordered, dropped or truncated chunks fail to open.
+
+    The func seals or opens one chunk as `func(nonce, data, associated_data)`.
+    """
+
+    def __init__(self, func, nonce, associated_data, chunk_size, workers):
+        self._func = func
+        self._nonce = int.from_bytes(nonce, 'big')
+        self._nonce_size = len(nonce)
+        self._associated_data = associated_data
+        self._chunk_size = chunk_size
+        self._workers = workers or tuning.workers()
+        self._pool = None
+        self._index = 0
+        self._buffer = bytearray()
+
+    def update(self, data):
+        self._buffer += data
+
+        # The final chunk is processed by `finalize`, so always keep at least one byte.
+        size = self._input_size
+        n = (len(self._buffer) - 1) // size * size
+        if n <= 0:
+            return b''
+
+        with memoryview(self._buffer) as view:
+            chunks = [
+                (self._index + i, bytes(view[offset:offset + size]))
+                for i, offset in enumerate(range(0, n, size))
+            ]
+        del self._buffer[:n]
+        self._index += len(chunks)
+
+        if self._workers < 2 or len(chunks) < 2:
+            return b''.join(map(self._process, chunks))
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(self._workers)
+        return b''.join(self._pool.map(self._process, chunks))
+
+    def finalize(self):
+        try:
+            return self._process((self._index, bytes(self._buffer)), last=1)
+        finally:
+            del self._buffer[:]
+            if self._pool is not None:
+                self._pool.shutdown()
+
+    def _process(self, args, last=0):
+        index, chunk = args
+        nonce = (self._nonce ^ (index << 8 | last)).to_bytes(self._nonce_size, 'big')
+        return self._func(nonce, chunk, self._associated_data)
+
+
+class AEADEncryptor(_AEADStream):
+    @property
+    def _input_size(self):
+        return self._chunk_size
+
+
+class AEADDecryptor(_AEADStream):
+    def __init__(self, func, nonce, associated_data, chunk_size, workers, tag_size):
+        super().__init__(func, nonce, associated_data, chunk_size, workers)
+        self._tag_size = tag_size
+
+    @property
+    def _input_size(self):
+        return self._chunk_size + self._tag_size
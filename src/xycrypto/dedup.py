@@ -0,0 +1,411 @@
+"""Duplicate files and tree comparison by staged hashing.
+
+Files can only be equal if their sizes are equal, so files are first grouped by size, which
+costs a stat. Files sharing a size are then hashed on a sample of their head and tail, and
+only files still sharing a sample are hashed in full. A file of up to 32 samples is hashed
+whole at the second stage and never read again, so a bigger file read in full after its
+sample costs at most a sixteenth more than reading it once; hard links to one file are read
+once. An optional persistent cache keeps the digests of files whose size and modification
+time are unchanged, so a repeated run reads almost nothing.
+"""
+
+import collections
+import functools
+import os
+
+from xycrypto import _fs
+
+__all__ = ['DigestCache', 'DuplicateResult', 'TreeDiff', 'find_duplicates', 'compare_trees']
+
+_SAMPLE_SIZE = 0x4000
+_WHOLE_SAMPLES = 32
+_VERSION = 2
+
+
+def _hex(digest):
+    return None if digest is None else digest.hex()
+
+
+def _unhex(s):
+    return None if s is None else bytes.fromhex(s)
+
+
+def _is_entry(entry):
+    # [size, mtime_ns, inode, sample hex or None, full hex or None], as `put` stores.
+    if not (isinstance(entry, list) and len(entry) == 5
+            and all(isinstance(x, int) for x in entry[:3])):
+        return False
+    try:
+        _unhex(entry[3])
+        _unhex(entry[4])
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+class DigestCache(object):
+    """Persistent sample and full digests of files, keyed by absolute path.
+
+    An entry is valid while the size, modification time and inode of the file are unchanged.
+    A cache file of another algorithm or sample size is ignored.
+    """
+
+    def __init__(self, filepath, algorithm, sample_size=_SAMPLE_SIZE):
+        self.filepath = os.fspath(filepath)
+        self.algorithm = algorithm
+        self.sample_size = sample_size
+        self._entries = {}
+
+        state = _fs.load_json(self.filepath)
+        if state is None or (state.get('version'), state.get('algorithm'),
+                             state.get('sample_size')) != (_VERSION, algorithm, sample_size):
+            return
+        entries = state.get('entries')
+        if isinstance(entries, dict):
+            self._entries = {path: entry for path, entry in entries.items() if _is_entry(entry)}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path, st):
+        """Return (sample, full) digests of file with stat result st, None where unknown."""
+
+        entry = self._entries.get(os.path.abspath(path))
+        if entry is None or entry[:3] != [st.st_size, st.st_mtime_ns, st.st_ino]:
+            return None, None
+        return _unhex(entry[3]), _unhex(entry[4])
+
+    def put(self, path, st, sample=None, full=None):
+        """Store the digests of file with stat result st, keeping those already known."""
+
+        old_sample, old_full = self.get(path, st)
+        self._entries[os.path.abspath(path)] = [
+            st.st_size, st.st_mtime_ns, st.st_ino,
+            _hex(sample or old_sample), _hex(full or old_full)
+        ]
+
+    def save(self):
+        """Write the cache to its file."""
+
+        state = {
+            'version': _VERSION,
+            'algorithm': self.algorithm,
+            'sample_size': self.sample_size,
+            'entries': self._entries
+        }
+        _fs.save_json(self.filepath, state)
+
+
+class DuplicateResult(object):
+    """Outcome of finding duplicate files.
+
+    The groups is a list of (size, paths) with sorted paths of equal content, largest files
+    first; errors is a sorted list of (path, exception) for files which could not be read.
+    The bytes_read counts what was actually read, against total_bytes of all distinct files.
+    """
+
+    def __init__(self, groups=(), errors=(), files=0, total_bytes=0, bytes_read=0):
+        self.groups = sorted(((size, sorted(paths)) for size, paths in groups),
+                             key=lambda item: (-item[0], item[1]))
+        self.errors = sorted(errors, key=lambda item: item[0])
+        self.files = files
+        self.total_bytes = total_bytes
+        self.bytes_read = bytes_read
+
+    @property
+    def wasted(self):
+        """Bytes taken by all copies but one of each group."""
+
+        return sum(size * (len(paths) - 1) for size, paths in self.groups)
+
+    def __iter__(self):
+        return iter(self.groups)
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __repr__(self):
+        return '{}(groups={}, wasted={}, errors={}, bytes_read={}/{})'.format(
+            type(self).__name__, len(self.groups), self.wasted, len(self.errors),
+            self.bytes_read, self.total_bytes
+        )
+
+
+class TreeDiff(object):
+    """Outcome of comparing two directories.
+
+    The same, different, only_a and only_b are sorted lists of relative paths; errors is a
+    sorted list of (path, exception) for files which could not be read.
+    """
+
+    def __init__(self, same=(), different=(), only_a=(), only_b=(), errors=(),
+                 total_bytes=0, bytes_read=0):
+        self.same = sorted(same)
+        self.different = sorted(different)
+        self.only_a = sorted(only_a)
+        self.only_b = sorted(only_b)
+        self.errors = sorted(errors, key=lambda item: item[0])
+        self.total_bytes = total_bytes
+        self.bytes_read = bytes_read
+
+    @property
+    def ok(self):
+        """Whether both directories hold the same files with the same content."""
+
+        return not (self.different or self.only_a or self.only_b or self.errors)
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return '{}(same={}, different={}, only_a={}, only_b={}, errors={}, ' \
+            'bytes_read={}/{})'.format(
+                type(self).__name__, len(self.same), len(self.different), len(self.only_a),
+                len(self.only_b), len(self.errors), self.bytes_read, self.total_bytes
+            )
+
+
+# ============================================================================ #
+#                                    Stages                                    #
+# ============================================================================ #
+
+
+class _Node(object):
+    """A distinct file with all paths linked to it."""
+
+    __slots__ = ('stat', 'paths', 'sample', 'full', 'error')
+
+    def __init__(self, stat, path):
+        self.stat = stat
+        self.paths = [path]
+        self.sample = None
+        self.full = None
+        self.error = None
+
+
+def _sample(new, sample_size, path):
+    """Return (digest, complete, bytes read) of the head and tail of file.
+
+    If the file is no bigger than `_WHOLE_SAMPLES` samples, it is hashed whole and complete
+    is true; the digest then equals the full digest.
+    """
+
+    ctx = new()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= _WHOLE_SAMPLES * sample_size:
+            data = f.read()
+            ctx.update(data)
+            return ctx.finalize(), True, len(data)
+
+        head = f.read(sample_size)
+        f.seek(size - sample_size)
+        tail = f.read(sample_size)
+        ctx.update(head)
+        ctx.update(tail)
+        return ctx.finalize(), False, len(head) + len(tail)
+
+
+def _stat_files(paths, errors):
+    """Return dict of path to node, with hard links to one file sharing a node."""
+
+    by_inode = {}
+    by_path = {}
+    for path in paths:
+        if path in by_path:
+            continue
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            errors.append((path, e))
+            continue
+
+        key = st.st_dev, st.st_ino
+        node = by_inode.get(key)
+        if node is None:
+            node = by_inode[key] = _Node(st, path)
+        else:
+            node.paths.append(path)
+        by_path[path] = node
+    return by_path
+
+
+def _unique(nodes):
+    return list({id(node): node for node in nodes}.values())
+
+
+def _group(nodes, key):
+    groups = collections.defaultdict(list)
+    for node in nodes:
+        groups[key(node)].append(node)
+    return groups
+
+
+class _Stages(object):
+    """Fill in the sample and full digests of nodes, through the cache if any."""
+
+    def __init__(self, new, func, sample_size, cache, executor, workers):
+        self.sample_func = functools.partial(
+            _fs.try_call, functools.partial(_sample, new, sample_size)
+        )
+        self.full_func = functools.partial(_fs.try_call, func)
+        self.cache = cache
+        self.executor = executor
+        self.workers = workers
+        self.errors = []
+        self.bytes_read = 0
+
+    def _run(self, func, nodes):
+        paths = [node.paths[0] for node in nodes]
+        results = _fs.map_files(func, paths, self.executor, self.workers)
+        for node, (result, error) in zip(nodes, results):
+            if error is not None:
+                node.error = error
+                self.errors.extend((path, error) for path in node.paths)
+            else:
+                yield node, result
+
+    def sample(self, nodes):
+        todo = []
+        for node in nodes:
+            if self.cache is not None:
+                node.sample, node.full = self.cache.get(node.paths[0], node.stat)
+            if node.sample is None:
+                todo.append(node)
+
+        for node, (digest, complete, nread) in self._run(self.sample_func, todo):
+            node.sample = digest
+            if complete:
+                node.full = digest
+            self.bytes_read += nread
+            if self.cache is not None:
+                self.cache.put(node.paths[0], node.stat, node.sample, node.full)
+
+    def full(self, nodes):
+        todo = [node for node in nodes if node.full is None and node.error is None]
+        for node, digest in self._run(self.full_func, todo):
+            node.full = digest
+            self.bytes_read += node.stat.st_size
+            if self.cache is not None:
+                self.cache.put(node.paths[0], node.stat, full=digest)
+
+
+def _open_cache(cache, algorithm, sample_size):
+    return None if cache is None else DigestCache(cache, algorithm, sample_size)
+
+
+def _iter_roots(roots, follow_symlinks, include, exclude):
+    if isinstance(roots, (str, bytes, os.PathLike)):
+        roots = [roots]
+    for root in roots:
+        if os.path.isdir(root):
+            yield from _fs.iter_files(root, follow_symlinks, include, exclude)
+        else:
+            yield os.fspath(root)
+
+
+# ============================================================================ #
+#                                    Engine                                    #
+# ============================================================================ #
+
+
+def find_duplicates(new, func, algorithm, roots, executor='thread', workers=None, cache=None,
+                    min_size=1, sample_size=_SAMPLE_SIZE,
+                    follow_symlinks=True, include=None, exclude=None):
+    """Return result of finding files with equal content under roots.
+
+    The new returns a fresh hash context, func(path) returns the full digest of a file, and
+    algorithm names both in the cache file at path cache, if given. The roots are files or
+    directories. Files smaller than min_size are ignored; hard links to one file are reported
+    as duplicates without reading it.
+    """
+
+    errors = []
+    by_path = _stat_files(_iter_roots(roots, follow_symlinks, include, exclude), errors)
+    nodes = [node for node in _unique(by_path.values()) if node.stat.st_size >= min_size]
+    stages = _Stages(new, func, sample_size, _open_cache(cache, algorithm, sample_size),
+                     executor, workers)
+
+    # Only files sharing their size with another file are sampled, and only files sharing
+    # their sample with another file are hashed in full.
+    by_size = _group(nodes, lambda node: node.stat.st_size)
+    candidates = [node for group in by_size.values() if len(group) > 1 for node in group]
+    stages.sample(candidates)
+
+    by_sample = _group((node for node in candidates if node.error is None),
+                       lambda node: (node.stat.st_size, node.sample))
+    stages.full(node for group in by_sample.values() if len(group) > 1 for node in group)
+
+    groups = []
+    for node_group in _group(
+            (node for node in nodes if node.error is None),
+            lambda node: id(node) if node.full is None else (node.stat.st_size, node.full)
+    ).values():
+        paths = [path for node in node_group for path in node.paths]
+        if len(paths) > 1:
+            groups.append((node_group[0].stat.st_size, paths))
+
+    if stages.cache is not None:
+        stages.cache.save()
+    return DuplicateResult(
+        groups, errors + stages.errors, len(by_path),
+        sum(node.stat.st_size for node in nodes), stages.bytes_read
+    )
+
+
+def compare_trees(new, func, algorithm, a, b, executor='thread', workers=None, cache=None,
+                  sample_size=_SAMPLE_SIZE, follow_symlinks=True, include=None, exclude=None):
+    """Return result of comparing files under directories a and b by relative path.
+
+    Files of different sizes differ without being read, and files of different samples
+    without being read in full. See `find_duplicates` for new, func, algorithm and cache.
+    """
+
+    files_a = {relpath: path for path, relpath in
+               _fs.walk_files(a, follow_symlinks, include, exclude)}
+    files_b = {relpath: path for path, relpath in
+               _fs.walk_files(b, follow_symlinks, include, exclude)}
+    only_a = [relpath for relpath in files_a if relpath not in files_b]
+    only_b = [relpath for relpath in files_b if relpath not in files_a]
+    common = [relpath for relpath in files_a if relpath in files_b]
+
+    errors = []
+    by_path = _stat_files(
+        [files_a[relpath] for relpath in common] + [files_b[relpath] for relpath in common],
+        errors
+    )
+    stages = _Stages(new, func, sample_size, _open_cache(cache, algorithm, sample_size),
+                     executor, workers)
+
+    same = []
+    different = []
+    pairs = []
+    for relpath in common:
+        x, y = by_path.get(files_a[relpath]), by_path.get(files_b[relpath])
+        if x is None or y is None:
+            continue
+        if x is y:
+            same.append(relpath)
+        elif x.stat.st_size != y.stat.st_size:
+            different.append(relpath)
+        else:
+            pairs.append((relpath, x, y))
+
+    stages.sample(_unique(node for _, x, y in pairs for node in (x, y)))
+    pairs = [(relpath, x, y) for relpath, x, y in pairs if x.error is None and y.error is None]
+    for relpath, x, y in pairs:
+        if x.sample != y.sample:
+            different.append(relpath)
+    pairs = [(relpath, x, y) for relpath, x, y in pairs if x.sample == y.sample]
+
+    stages.full(_unique(node for _, x, y in pairs for node in (x, y)))
+    for relpath, x, y in pairs:
+        if x.error is None and y.error is None:
+            (same if x.full == y.full else different).append(relpath)
+
+    if stages.cache is not None:
+        stages.cache.save()
+    return TreeDiff(
+        same, different, only_a, only_b, errors + stages.errors,
+        sum(node.stat.st_size for node in _unique(by_path.values())), stages.bytes_read
+    )
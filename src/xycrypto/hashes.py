@@ -9,12 +9,15 @@ __all__ = [
     'BLAKE2b', 'BLAKE2s'
 ]
 
-_CHUNK_SIZE = 0x100000
+_FINGERPRINT_LABEL = b'xycrypto key fingerprint'
+_FINGERPRINT_SIZE = 8
 
 
 class Hash(metaclass=abc.ABCMeta):
     """Abstract base class for hash context."""
 
+    __slots__ = ('_ctx',)
+
     @property
     @abc.abstractmethod
     def _cls(self):
@@ -42,7 +45,14 @@ class Hash(metaclass=abc.ABCMeta):
     def copy(self):
         """Copy the current context."""
 
-        return self._ctx.copy()
+        other = type(self).__new__(type(self))
+        other._ctx = self._ctx.copy()
+        return other
+
+    def fork(self, n):
+        """Return a list of n copies of the current context."""
+
+        return [self.copy() for _ in range(n)]
 
     # ===============
     # Fast Interfaces
@@ -68,119 +78,261 @@ class Hash(metaclass=abc.ABCMeta):
         return ctx.finalize()
 
     @classmethod
-    def hash_fileobj(cls, fileobj, **kwargs):
-        """Return hash of data from file object."""
+    def hash_fileobj(cls, fileobj, *, buffers=0, buffer_size=None, **kwargs):
+        """Return hash of data from file object.
+
+        If buffers is nonzero, a background thread reads ahead into that many buffers.
+        """
 
-        it = iter(functools.partial(fileobj.read, _CHUNK_SIZE), b'')
+        from xycrypto import _readahead
+
+        it = _readahead.iter_chunks(fileobj, buffer_size, buffers)
         return cls.hash_iter(it, **kwargs)
 
     @classmethod
-    def hash_file(cls, filepath, **kwargs):
-        """Return hash of data from file."""
+    def hash_file(cls, filepath, *, buffers=0, buffer_size=None,
+                  resume=False, checkpoint=None, **kwargs):
+        """Return hash of data from file.
+
+        If resume is true, return the tree hash of `xycrypto.checkpoint` instead, continuing
+        from the checkpoint file and updating it.
+        """
+
+        from xycrypto import checkpoint as _checkpoint
 
+        if resume:
+            return _checkpoint.hash_file_resumable(
+                functools.partial(cls, **kwargs), _algorithm(cls, kwargs), filepath,
+                checkpoint, buffer_size=buffer_size
+            )
         with open(filepath, 'rb') as f:
-            return cls.hash_fileobj(f, **kwargs)
+            return cls.hash_fileobj(f, buffers=buffers, buffer_size=buffer_size, **kwargs)
 
     @classmethod
-    def hash_dir(cls, dirpath, **kwargs):
-        """Return hash of data from directory."""
-
-        try:
-            digest_size = getattr(cls, 'digest_size')
-        except AttributeError:
-            digest_size = getattr(cls(**kwargs), 'digest_size')
-
-        def _hash_dir(cls, dirpath, **kwargs):
-            result = b'\x00' * digest_size
-            with os.scandir(dirpath) as it:
-                for entry in it:
-                    if entry.is_dir():
-                        value = cls.hash_dir(entry, **kwargs)
-                    else:
-                        value = cls.hash_file(entry, **kwargs)
-                    result = bytes(x ^ y for x, y in zip(result, value))
-            return result
-
-        return _hash_dir(cls, dirpath, **kwargs)
+    def hash_files(cls, paths, *, executor='process', workers=None, **kwargs):
+        """Return list of hashes of data from files, in input order."""
+
+        from xycrypto import _fs
+
+        func = functools.partial(cls.hash_file, **kwargs)
+        return _fs.map_files(func, paths, executor, workers)
 
     @classmethod
-    def hash_fs(cls, path, **kwargs):
+    def hash_dir(cls, dirpath, *, executor=None, workers=None,
+                 follow_symlinks=True, include=None, exclude=None, **kwargs):
+        """Return hash of data from directory.
+
+        The include and exclude are glob patterns matched against paths relative to dirpath.
+        """
+
+        from xycrypto import _fs
+
+        digest_size = cls(**_fs.context_kwargs(kwargs)).digest_size
+        paths = _fs.iter_files(dirpath, follow_symlinks, include, exclude)
+        if executor is None:
+            digests = (cls.hash_file(path, **kwargs) for path in paths)
+        else:
+            digests = cls.hash_files(paths, executor=executor, workers=workers, **kwargs)
+        return _fs.xor_fold(digests, digest_size)
+
+    @classmethod
+    def hash_fs(cls, path, *, executor=None, workers=None,
+                follow_symlinks=True, include=None, exclude=None, **kwargs):
         """Return hash of data from filesystems."""
 
         if os.path.isdir(path):
-            return cls.hash_dir(path, **kwargs)
+            return cls.hash_dir(
+                path, executor=executor, workers=workers,
+                follow_symlinks=follow_symlinks, include=include, exclude=exclude, **kwargs
+            )
         return cls.hash_file(path, **kwargs)
 
+    @classmethod
+    def hash_paths_partial(cls, paths, *, executor=None, workers=None, **kwargs):
+        """Return `xycrypto.shards.PartialDigest` of files, mergeable by `merge_partials`."""
+
+        from xycrypto import _fs, shards as _shards
+
+        hash_kwargs = _fs.context_kwargs(kwargs)
+        ctx = cls(**hash_kwargs)
+        if executor is None:
+            digests = (cls.hash_file(path, **kwargs) for path in paths)
+        else:
+            digests = cls.hash_files(paths, executor=executor, workers=workers, **kwargs)
+        return _shards.PartialDigest.from_digests(
+            _algorithm(cls, hash_kwargs), ctx.digest_size, digests
+        )
+
+    @classmethod
+    def merge_partials(cls, partials, **kwargs):
+        """Return hash of data from all files of the partial digests.
+
+        The result equals `hash_dir` of a directory when the partials cover its files.
+        """
+
+        from xycrypto import shards as _shards
+
+        result = _shards.merge_partials(partials)
+        algorithm = _algorithm(cls, kwargs)
+        if result.algorithm != algorithm:
+            raise ValueError('partial algorithm is {}, not {}'.format(result.algorithm, algorithm))
+        return result.digest()
+
+    @classmethod
+    def build_manifest(cls, root, *, executor='thread', workers=None,
+                       follow_symlinks=True, include=None, exclude=None, **kwargs):
+        """Return `xycrypto.manifest.Manifest` of hashes of files under directory."""
+
+        from xycrypto import _fs, manifest as _manifest
+
+        func = functools.partial(cls.hash_file, **kwargs)
+        return _manifest.build(
+            func, _algorithm(cls, _fs.context_kwargs(kwargs)), root,
+            executor=executor, workers=workers,
+            follow_symlinks=follow_symlinks, include=include, exclude=exclude
+        )
+
+    @classmethod
+    def verify_manifest(cls, root, manifest, *, executor='thread', workers=None,
+                        fail_fast=False, follow_symlinks=True, include=None, exclude=None,
+                        **kwargs):
+        """Return `xycrypto.manifest.VerifyResult` of files under directory against manifest.
+
+        Files are hashed in parallel. If fail_fast is true, stop at the first difference.
+        """
+
+        from xycrypto import _fs, manifest as _manifest
+
+        func = functools.partial(cls.hash_file, **kwargs)
+        return _manifest.verify(
+            func, _algorithm(cls, _fs.context_kwargs(kwargs)), root, manifest, executor=executor,
+            workers=workers, fail_fast=fail_fast,
+            follow_symlinks=follow_symlinks, include=include, exclude=exclude
+        )
+
+    @classmethod
+    def find_duplicates(cls, roots, *, executor='thread', workers=None, cache=None, min_size=1,
+                        follow_symlinks=True, include=None, exclude=None, **kwargs):
+        """Return `xycrypto.dedup.DuplicateResult` of files with equal content under roots.
+
+        Files are grouped by size, then by a hash of their head and tail, and only the files
+        left in a group are hashed in full. If cache is a path, digests are kept there.
+        """
+
+        from xycrypto import _fs, dedup as _dedup
+
+        hash_kwargs = _fs.context_kwargs(kwargs)
+        return _dedup.find_duplicates(
+            functools.partial(cls, **hash_kwargs), functools.partial(cls.hash_file, **kwargs),
+            _algorithm(cls, hash_kwargs), roots, executor=executor, workers=workers, cache=cache,
+            min_size=min_size, follow_symlinks=follow_symlinks, include=include, exclude=exclude
+        )
+
+    @classmethod
+    def compare_trees(cls, a, b, *, executor='thread', workers=None, cache=None,
+                      follow_symlinks=True, include=None, exclude=None, **kwargs):
+        """Return `xycrypto.dedup.TreeDiff` of files under directories a and b.
+
+        Like `find_duplicates`, files are only hashed in full when size and sample agree.
+        """
+
+        from xycrypto import _fs, dedup as _dedup
+
+        hash_kwargs = _fs.context_kwargs(kwargs)
+        return _dedup.compare_trees(
+            functools.partial(cls, **hash_kwargs), functools.partial(cls.hash_file, **kwargs),
+            _algorithm(cls, hash_kwargs), a, b, executor=executor, workers=workers, cache=cache,
+            follow_symlinks=follow_symlinks, include=include, exclude=exclude
+        )
+
 
 class ExtendableHash(Hash):
     """Abstract base class for extendable hash context."""
 
+    __slots__ = ('digest_size',)
+
     @abc.abstractmethod
     def __init__(self):
         """Initialize the current context."""
 
+    def copy(self):
+        other = super().copy()
+        other.digest_size = self.digest_size
+        return other
+
 
 class MD5(Hash):
+    __slots__ = ()
     _cls = hashlib.md5
     block_size = 64
     digest_size = 16
 
 
 class SHA1(Hash):
+    __slots__ = ()
     _cls = hashlib.sha1
     block_size = 64
     digest_size = 20
 
 
 class SHA224(Hash):
+    __slots__ = ()
     _cls = hashlib.sha224
     block_size = 64
     digest_size = 28
 
 
 class SHA256(Hash):
+    __slots__ = ()
     _cls = hashlib.sha256
     block_size = 64
     digest_size = 32
 
 
 class SHA384(Hash):
+    __slots__ = ()
     _cls = hashlib.sha384
     block_size = 128
     digest_size = 48
 
 
 class SHA512(Hash):
+    __slots__ = ()
     _cls = hashlib.sha512
     block_size = 128
     digest_size = 64
 
 
 class SHA3_224(Hash):
+    __slots__ = ()
     _cls = hashlib.sha3_224
     block_size = 144
     digest_size = 28
 
 
 class SHA3_256(Hash):
+    __slots__ = ()
     _cls = hashlib.sha3_256
     block_size = 136
     digest_size = 32
 
 
 class SHA3_384(Hash):
+    __slots__ = ()
     _cls = hashlib.sha3_384
     block_size = 104
     digest_size = 48
 
 
 class SHA3_512(Hash):
+    __slots__ = ()
     _cls = hashlib.sha3_512
     block_size = 72
     digest_size = 64
 
 
 class SHAKE128(ExtendableHash):
+    __slots__ = ()
     _cls = hashlib.shake_128
     block_size = 168
 
@@ -193,6 +345,7 @@ class SHAKE128(ExtendableHash):
 
 
 class SHAKE256(ExtendableHash):
+    __slots__ = ()
     _cls = hashlib.shake_256
     block_size = 136
 
@@ -205,6 +358,7 @@ class SHAKE256(ExtendableHash):
 
 
 class BLAKE2b(ExtendableHash):
+    __slots__ = ()
     _cls = hashlib.blake2b
     block_size = 128
     max_digest_size = 64
@@ -226,6 +380,7 @@ class BLAKE2b(ExtendableHash):
 
 
 class BLAKE2s(ExtendableHash):
+    __slots__ = ()
     _cls = hashlib.blake2s
     block_size = 64
     max_digest_size = 32
@@ -244,3 +399,16 @@ class BLAKE2s(ExtendableHash):
             inner_size=inner_size, last_node=last_node
         )
         self.digest_size = digest_size
+
+
+def _algorithm(cls, kwargs):
+    # Extendable hashes are named with their digest size, which is a parameter.
+    name = cls.__name__
+    if issubclass(cls, ExtendableHash):
+        name = '{}-{}'.format(name, cls(**kwargs).digest_size * 8)
+    # Other parameters, such as the key, salt or person of BLAKE2, are named by a short hash
+    # of a fixed label under them, so results under different ones are never combined.
+    if any(k != 'digest_size' for k in kwargs):
+        fingerprint = cls.hash(_FINGERPRINT_LABEL, **kwargs)[:_FINGERPRINT_SIZE]
+        name = '{}-{}'.format(name, fingerprint.hex())
+    return name
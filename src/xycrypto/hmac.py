@@ -4,14 +4,18 @@ from hmac import compare_digest
 
 __all__ = ['HMAC', 'compare_digest']
 
-_CHUNK_SIZE = 0x100000
 _TRANS_36 = bytes((x ^ 0x36) for x in range(256))
 _TRANS_5C = bytes((x ^ 0x5C) for x in range(256))
 
+_FINGERPRINT_LABEL = b'xycrypto key fingerprint'
+_FINGERPRINT_SIZE = 8
+
 
 class HMAC(object):
     """Hash-based Message Authentication Code."""
 
+    __slots__ = ('_i_ctx', '_o_ctx', 'block_size', 'digest_size')
+
     # ==================
     # Context Interfaces
     # ==================
@@ -19,19 +23,17 @@ class HMAC(object):
     def __init__(self, hash_cls, key):
         """Initialize the current context."""
 
-        self._i_ctx = hash_cls()
-        self._o_ctx = hash_cls()
-        self.block_size = self._o_ctx.block_size
-        self.digest_size = self._o_ctx.digest_size
+        i_ctx = self._i_ctx = hash_cls()
+        o_ctx = self._o_ctx = hash_cls()
+        block_size = self.block_size = o_ctx.block_size
+        self.digest_size = o_ctx.digest_size
 
-        if len(key) > self.block_size:
-            ctx = hash_cls()
-            ctx.update(key)
-            key = ctx.finalize()
-        key = key.ljust(self.block_size, b'\0')
+        if len(key) > block_size:
+            key = hash_cls.hash(key)
+        key = key.ljust(block_size, b'\0')
 
-        self._i_ctx.update(key.translate(_TRANS_36))
-        self._o_ctx.update(key.translate(_TRANS_5C))
+        i_ctx.update(key.translate(_TRANS_36))
+        o_ctx.update(key.translate(_TRANS_5C))
 
     def update(self, data):
         """Update the current context."""
@@ -60,6 +62,11 @@ class HMAC(object):
         other.digest_size = self.digest_size
         return other
 
+    def fork(self, n):
+        """Return a list of n copies of the current context."""
+
+        return [self.copy() for _ in range(n)]
+
     # ===============
     # Fast Interfaces
     # ===============
@@ -84,42 +91,147 @@ class HMAC(object):
         return ctx.finalize()
 
     @classmethod
-    def hash_fileobj(cls, hash_cls, key, fileobj, **kwargs):
-        """Return hash of data from file object."""
+    def hash_fileobj(cls, hash_cls, key, fileobj, *,
+                     buffers=0, buffer_size=None, **kwargs):
+        """Return hash of data from file object.
 
-        it = iter(functools.partial(fileobj.read, _CHUNK_SIZE), b'')
+        If buffers is nonzero, a background thread reads ahead into that many buffers.
+        """
+
+        from xycrypto import _readahead
+
+        it = _readahead.iter_chunks(fileobj, buffer_size, buffers)
         return cls.hash_iter(hash_cls, key, it, **kwargs)
 
     @classmethod
-    def hash_file(cls, hash_cls, key, filepath, **kwargs):
-        """Return hash of data from file."""
+    def hash_file(cls, hash_cls, key, filepath, *,
+                  buffers=0, buffer_size=None, resume=False, checkpoint=None, **kwargs):
+        """Return hash of data from file.
+
+        If resume is true, return the tree hash of `xycrypto.checkpoint` instead, continuing
+        from the checkpoint file and updating it.
+        """
+
+        from xycrypto import checkpoint as _checkpoint
 
+        if resume:
+            return _checkpoint.hash_file_resumable(
+                functools.partial(cls, hash_cls, key, **kwargs), _algorithm(hash_cls, key),
+                filepath, checkpoint, buffer_size=buffer_size
+            )
         with open(filepath, 'rb') as f:
-            return cls.hash_fileobj(hash_cls, key, f, **kwargs)
+            return cls.hash_fileobj(
+                hash_cls, key, f, buffers=buffers, buffer_size=buffer_size, **kwargs
+            )
 
     @classmethod
-    def hash_dir(cls, hash_cls, key, dirpath, **kwargs):
-        """Return hash of data from directory."""
+    def hash_files(cls, hash_cls, key, paths, *, executor='process', workers=None, **kwargs):
+        """Return list of hashes of data from files, in input order."""
 
-        digest_size = getattr(cls(hash_cls, key, **kwargs), 'digest_size')
+        from xycrypto import _fs
 
-        def _hash_dir(cls, hash_cls, key, dirpath, **kwargs):
-            result = b'\x00' * digest_size
-            with os.scandir(dirpath) as it:
-                for entry in it:
-                    if entry.is_dir():
-                        value = cls.hash_dir(hash_cls, key, entry, **kwargs)
-                    else:
-                        value = cls.hash_file(hash_cls, key, entry, **kwargs)
-                    result = bytes(x ^ y for x, y in zip(result, value))
-            return result
+        func = functools.partial(cls.hash_file, hash_cls, key, **kwargs)
+        return _fs.map_files(func, paths, executor, workers)
 
-        return _hash_dir(cls, hash_cls, key, dirpath, **kwargs)
+    @classmethod
+    def hash_dir(cls, hash_cls, key, dirpath, *, executor=None, workers=None,
+                 follow_symlinks=True, include=None, exclude=None, **kwargs):
+        """Return hash of data from directory.
+
+        The include and exclude are glob patterns matched against paths relative to dirpath.
+        """
+
+        from xycrypto import _fs
+
+        digest_size = cls(hash_cls, key, **_fs.context_kwargs(kwargs)).digest_size
+        paths = _fs.iter_files(dirpath, follow_symlinks, include, exclude)
+        if executor is None:
+            digests = (cls.hash_file(hash_cls, key, path, **kwargs) for path in paths)
+        else:
+            digests = cls.hash_files(
+                hash_cls, key, paths, executor=executor, workers=workers, **kwargs
+            )
+        return _fs.xor_fold(digests, digest_size)
 
     @classmethod
-    def hash_fs(cls, hash_cls, key, path, **kwargs):
+    def hash_fs(cls, hash_cls, key, path, *, executor=None, workers=None,
+                follow_symlinks=True, include=None, exclude=None, **kwargs):
         """Return hash of data from filesystems."""
 
         if os.path.isdir(path):
-            return cls.hash_dir(hash_cls, key, path, **kwargs)
+            return cls.hash_dir(
+                hash_cls, key, path, executor=executor, workers=workers,
+                follow_symlinks=follow_symlinks, include=include, exclude=exclude, **kwargs
+            )
         return cls.hash_file(hash_cls, key, path, **kwargs)
+
+    @classmethod
+    def hash_paths_partial(cls, hash_cls, key, paths, *, executor=None, workers=None, **kwargs):
+        """Return `xycrypto.shards.PartialDigest` of files, mergeable by `merge_partials`."""
+
+        from xycrypto import _fs, shards as _shards
+
+        ctx = cls(hash_cls, key, **_fs.context_kwargs(kwargs))
+        if executor is None:
+            digests = (cls.hash_file(hash_cls, key, path, **kwargs) for path in paths)
+        else:
+            digests = cls.hash_files(
+                hash_cls, key, paths, executor=executor, workers=workers, **kwargs
+            )
+        return _shards.PartialDigest.from_digests(
+            _algorithm(hash_cls, key), ctx.digest_size, digests
+        )
+
+    @classmethod
+    def merge_partials(cls, hash_cls, key, partials):
+        """Return hash of data from all files of the partial digests.
+
+        The result equals `hash_dir` of a directory when the partials cover its files. The
+        partials must have been computed under the same key.
+        """
+
+        from xycrypto import shards as _shards
+
+        result = _shards.merge_partials(partials)
+        algorithm = _algorithm(hash_cls, key)
+        if result.algorithm != algorithm:
+            raise ValueError('partial algorithm is {}, not {}'.format(result.algorithm, algorithm))
+        return result.digest()
+
+    @classmethod
+    def build_manifest(cls, hash_cls, key, root, *, executor='thread', workers=None,
+                       follow_symlinks=True, include=None, exclude=None, **kwargs):
+        """Return `xycrypto.manifest.Manifest` of hashes of files under directory."""
+
+        from xycrypto import manifest as _manifest
+
+        func = functools.partial(cls.hash_file, hash_cls, key, **kwargs)
+        return _manifest.build(
+            func, _algorithm(hash_cls, key), root, executor=executor, workers=workers,
+            follow_symlinks=follow_symlinks, include=include, exclude=exclude
+        )
+
+    @classmethod
+    def verify_manifest(cls, hash_cls, key, root, manifest, *, executor='thread',
+                        workers=None, fail_fast=False, follow_symlinks=True,
+                        include=None, exclude=None, **kwargs):
+        """Return `xycrypto.manifest.VerifyResult` of files under directory against manifest.
+
+        Files are hashed in parallel. If fail_fast is true, stop at the first difference.
+        """
+
+        from xycrypto import manifest as _manifest
+
+        func = functools.partial(cls.hash_file, hash_cls, key, **kwargs)
+        return _manifest.verify(
+            func, _algorithm(hash_cls, key), root, manifest, executor=executor,
+            workers=workers, fail_fast=fail_fast,
+            follow_symlinks=follow_symlinks, include=include, exclude=exclude
+        )
+
+
+def _algorithm(hash_cls, key):
+    # The id names the key by a short HMAC of a fixed label, so results under different keys,
+    # such as partials, manifests or checkpoints, are never combined.
+    fingerprint = HMAC.hash(hash_cls, key, _FINGERPRINT_LABEL)[:_FINGERPRINT_SIZE]
+    return 'HMAC-{}-{}'.format(hash_cls.__name__, fingerprint.hex())
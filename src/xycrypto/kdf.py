@@ -0,0 +1,123 @@
+import hashlib
+
+from xycrypto._cache import TTLCache
+from xycrypto.hashes import ExtendableHash
+from xycrypto.hmac import HMAC
+
+__all__ = ['pbkdf2', 'hkdf', 'KeyCache']
+
+
+class KeyCache(TTLCache):
+    """Bounded cache of derived keys with optional time-to-live of entries.
+
+    Secrets are never used as cache keys directly, only their SHA-256 digests.
+    """
+
+    def __init__(self, maxsize=128, ttl=300):
+        super().__init__(maxsize, ttl)
+
+
+def _to_bytes(data):
+    if isinstance(data, str):
+        return data.encode('utf-8')
+    return data
+
+
+def _hashlib_name(hash_cls):
+    """Return the hashlib name of hash class, or None if hashlib can not derive with it."""
+
+    cls = getattr(hash_cls, '_cls', None)
+    if cls is None or issubclass(hash_cls, ExtendableHash):
+        return None
+    return cls().name
+
+
+def _cache_key(*args):
+    return hashlib.sha256(repr(args).encode('utf-8')).digest()
+
+
+def _pbkdf2(hash_cls, password, salt, iterations, length):
+    name = _hashlib_name(hash_cls)
+    if name is not None:
+        try:
+            return hashlib.pbkdf2_hmac(name, password, salt, iterations, length)
+        except ValueError:
+            pass    # unsupported by the OpenSSL build, fall back to pure Python
+
+    # The inner and outer contexts are keyed once and copied for every HMAC call.
+    prf = HMAC(hash_cls, password)
+    i_ctx, o_ctx = prf._i_ctx, prf._o_ctx
+    digest_size = prf.digest_size
+
+    blocks = []
+    for i in range(1, -(-length // digest_size) + 1):
+        value = salt + i.to_bytes(4, 'big')
+        result = 0
+        for _ in range(iterations):
+            ctx = i_ctx.copy()
+            ctx.update(value)
+            inner = ctx.finalize()
+            ctx = o_ctx.copy()
+            ctx.update(inner)
+            value = ctx.finalize()
+            result ^= int.from_bytes(value, 'big')
+        blocks.append(result.to_bytes(digest_size, 'big'))
+    return b''.join(blocks)[:length]
+
+
+def pbkdf2(hash_cls, password, salt, iterations, length, *, cache=None):
+    """Return key derived from password by PBKDF2-HMAC (RFC 8018).
+
+    Derive natively by `hashlib.pbkdf2_hmac` if possible, else in pure Python.
+    """
+
+    password = _to_bytes(password)
+    salt = _to_bytes(salt)
+    if iterations < 1:
+        raise ValueError('iterations must be >= 1, got {}'.format(iterations))
+    if length < 1:
+        raise ValueError('length must be >= 1, got {}'.format(length))
+
+    if cache is None:
+        return _pbkdf2(hash_cls, password, salt, iterations, length)
+    key = _cache_key('pbkdf2', hash_cls.__qualname__, password, salt, iterations, length)
+    return cache.get_or_compute(
+        key, lambda: _pbkdf2(hash_cls, password, salt, iterations, length)
+    )
+
+
+def _hkdf(hash_cls, key_material, length, salt, info):
+    digest_size = hash_cls().digest_size
+    if length > 255 * digest_size:
+        raise ValueError('length must be <= {}, got {}'.format(255 * digest_size, length))
+
+    if salt is None:
+        salt = b'\x00' * digest_size
+    prk = HMAC.hash(hash_cls, salt, key_material)
+
+    prf = HMAC(hash_cls, prk)
+    blocks = []
+    block = b''
+    for i in range(1, -(-length // digest_size) + 1):
+        ctx = prf.copy()
+        ctx.update(block + info + bytes((i,)))
+        block = ctx.finalize()
+        blocks.append(block)
+    return b''.join(blocks)[:length]
+
+
+def hkdf(hash_cls, key_material, length, *, salt=None, info=b'', cache=None):
+    """Return key derived from key material by HKDF (RFC 5869)."""
+
+    key_material = _to_bytes(key_material)
+    salt = _to_bytes(salt)
+    info = _to_bytes(info)
+    if length < 1:
+        raise ValueError('length must be >= 1, got {}'.format(length))
+
+    if cache is None:
+        return _hkdf(hash_cls, key_material, length, salt, info)
+    key = _cache_key('hkdf', hash_cls.__qualname__, key_material, length, salt, info)
+    return cache.get_or_compute(
+        key, lambda: _hkdf(hash_cls, key_material, length, salt, info)
+    )
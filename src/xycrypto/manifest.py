@@ -0,0 +1,183 @@
+"""Manifests of file digests under a directory.
+
+The on-disk format is compatible with the output of `sha256sum` and friends: one line of
+`<hex digest>  <relpath>` per file, preceded by a comment line naming the algorithm. Paths are
+relative to the root with '/' separators; a path containing a backslash, a newline or a
+carriage return is escaped, and its line starts with a backslash, as GNU coreutils does.
+Lines end with '\n' only, so other line breaks are part of the path.
+"""
+
+import functools
+from hmac import compare_digest
+
+from xycrypto import _fs
+
+__all__ = ['Manifest', 'VerifyResult']
+
+_MAGIC = '# xycrypto manifest'
+
+
+def _escape(relpath):
+    return relpath.replace('\\', '\\\\').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _unescape(relpath):
+    return relpath.replace('\\\\', '\0').replace('\\n', '\n').replace('\\r', '\r') \
+        .replace('\0', '\\')
+
+
+class Manifest(object):
+    """Mapping of relative paths to digests, computed by the named algorithm."""
+
+    def __init__(self, algorithm, entries=None):
+        self.algorithm = algorithm
+        self.entries = dict(entries or ())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, relpath):
+        return relpath in self.entries
+
+    def __getitem__(self, relpath):
+        return self.entries[relpath]
+
+    def __eq__(self, other):
+        if not isinstance(other, Manifest):
+            return NotImplemented
+        return self.algorithm == other.algorithm and self.entries == other.entries
+
+    def __repr__(self):
+        return '{}({!r}, <{} entries>)'.format(type(self).__name__, self.algorithm, len(self))
+
+    def dump(self, fileobj):
+        """Write the manifest to binary file object."""
+
+        lines = ['{} {}\n'.format(_MAGIC, self.algorithm)]
+        for relpath in sorted(self.entries):
+            escaped = _escape(relpath)
+            prefix = '\\' if escaped != relpath else ''
+            lines.append('{}{}  {}\n'.format(prefix, self.entries[relpath].hex(), escaped))
+        fileobj.write(''.join(lines).encode('utf-8', 'surrogateescape'))
+
+    def save(self, filepath):
+        """Write the manifest to file."""
+
+        with open(filepath, 'wb') as f:
+            self.dump(f)
+
+    @classmethod
+    def load(cls, fileobj):
+        """Read the manifest from binary file object."""
+
+        text = fileobj.read().decode('utf-8', 'surrogateescape')
+        # Not `splitlines`, which also breaks at characters such as '\x0c' or '\x85'.
+        lines = text.split('\n')
+        if lines[-1] == '':
+            lines.pop()
+        if not lines or not lines[0].startswith(_MAGIC + ' '):
+            raise ValueError('not a manifest')
+
+        manifest = cls(lines[0][len(_MAGIC) + 1:].strip())
+        for lineno, line in enumerate(lines[1:], 2):
+            if line.endswith('\r'):    # written with CRLF; a '\r' in a path is escaped
+                line = line[:-1]
+            escaped = line.startswith('\\')
+            if escaped:
+                line = line[1:]
+            digest, sep, relpath = line.partition('  ')
+            if not sep:
+                raise ValueError('invalid manifest line {}'.format(lineno))
+            if escaped:
+                relpath = _unescape(relpath)
+            manifest.entries[relpath] = bytes.fromhex(digest)
+        return manifest
+
+    @classmethod
+    def load_file(cls, filepath):
+        """Read the manifest from file."""
+
+        with open(filepath, 'rb') as f:
+            return cls.load(f)
+
+
+class VerifyResult(object):
+    """Outcome of verifying a directory against a manifest.
+
+    The mismatched, missing and extra are sorted lists of relative paths; errors is a sorted
+    list of (relpath, exception) for files which could not be read.
+    """
+
+    def __init__(self, matched=0, mismatched=(), missing=(), extra=(), errors=()):
+        self.matched = matched
+        self.mismatched = sorted(mismatched)
+        self.missing = sorted(missing)
+        self.extra = sorted(extra)
+        self.errors = sorted(errors, key=lambda item: item[0])
+
+    @property
+    def ok(self):
+        """Whether the directory matches the manifest exactly."""
+
+        return not (self.mismatched or self.missing or self.extra or self.errors)
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return '{}(matched={}, mismatched={}, missing={}, extra={}, errors={})'.format(
+            type(self).__name__, self.matched, len(self.mismatched), len(self.missing),
+            len(self.extra), len(self.errors)
+        )
+
+
+def build(func, algorithm, root, executor='thread', workers=None,
+          follow_symlinks=True, include=None, exclude=None):
+    """Return manifest of func(path) for all files under root."""
+
+    items = list(_fs.walk_files(root, follow_symlinks, include, exclude))
+    digests = _fs.map_files(func, [path for path, _ in items], executor, workers)
+    return Manifest(algorithm, zip((relpath for _, relpath in items), digests))
+
+
+def verify(func, algorithm, root, manifest, executor='thread', workers=None, fail_fast=False,
+           follow_symlinks=True, include=None, exclude=None):
+    """Return result of verifying files under root against manifest.
+
+    If fail_fast is true, stop at the first difference found; the result is then partial.
+    """
+
+    if manifest.algorithm != algorithm:
+        raise ValueError('manifest algorithm is {}, not {}'.format(manifest.algorithm, algorithm))
+
+    found = dict((path, relpath) for path, relpath in
+                 _fs.walk_files(root, follow_symlinks, include, exclude))
+    present = set(found.values())
+    missing = [relpath for relpath in manifest if relpath not in present]
+    extra = [relpath for relpath in present if relpath not in manifest]
+    result = VerifyResult(missing=missing, extra=extra)
+    if fail_fast and not result.ok:
+        return result
+
+    paths = [path for path, relpath in found.items() if relpath in manifest]
+    it = _fs.imap_files(functools.partial(_fs.try_call, func), paths, executor, workers)
+    try:
+        for path, (digest, error) in it:
+            relpath = found[path]
+            if error is not None:
+                result.errors.append((relpath, error))
+            elif compare_digest(digest, manifest[relpath]):
+                result.matched += 1
+            else:
+                result.mismatched.append(relpath)
+            if fail_fast and not result.ok:
+                break
+    finally:
+        it.close()
+
+    result.mismatched.sort()
+    result.errors.sort(key=lambda item: item[0])
+    return result
@@ -1,6 +1,13 @@
 import abc
+import array
 import inspect
-import os
+
+from xycrypto import rand
+
+try:
+    import numpy
+except ImportError:     # optional, accelerates `unpad_many`
+    numpy = None
 
 __all__ = ['DUMMY', 'PKCS7', 'ANSIX923', 'ISO10126']
 
@@ -13,6 +20,8 @@ __all__ = ['DUMMY', 'PKCS7', 'ANSIX923', 'ISO10126']
 class Padding(metaclass=abc.ABCMeta):
     """Abstract base class for padding."""
 
+    __slots__ = ()
+
     @abc.abstractmethod
     def padder(self):
         """Return the padder context."""
@@ -33,6 +42,8 @@ class Padding(metaclass=abc.ABCMeta):
 class PaddingContext(metaclass=abc.ABCMeta):
     """Abstract base class for padding context."""
 
+    __slots__ = ()
+
     @abc.abstractmethod
     def update(self, data):
         """Update the current context and return the available data."""
@@ -45,10 +56,14 @@ class PaddingContext(metaclass=abc.ABCMeta):
 class Padder(PaddingContext):
     """Abstract base class for padder context."""
 
+    __slots__ = ()
+
 
 class Unpadder(PaddingContext):
     """Abstract base class for unpadder context."""
 
+    __slots__ = ()
+
 
 # ============================================================================ #
 #                                  Frameworks                                  #
@@ -56,6 +71,8 @@ class Unpadder(PaddingContext):
 
 
 class _PaddingFramework(Padding):
+    __slots__ = ('block_size',)
+
     def __init__(self, block_size):
         if not isinstance(block_size, int):
             raise TypeError(
@@ -69,18 +86,122 @@ class _PaddingFramework(Padding):
 
         self.block_size = block_size
 
+    @property
+    @abc.abstractmethod
+    def _padder(self):
+        """The class of padder context."""
+
+    @property
+    @abc.abstractmethod
+    def _unpadder(self):
+        """The class of unpadder context."""
+
+    def padder(self):
+        return self._padder(self.block_size)
+
+    def unpadder(self):
+        return self._unpadder(self.block_size)
+
     def pad(self, data):
-        padder = self.padder()
-        temp = padder.update(data)
-        return temp + padder.finalize()
+        return data + self._padding(len(data))
 
     def unpad(self, data):
-        unpadder = self.unpadder()
-        temp = unpadder.update(data)
-        return temp + unpadder.finalize()
+        return data[:self._unpadded_size(data)]
+
+    def pad_many(self, messages):
+        """Pad each message and return (buffer, offsets) of all padded messages.
+
+        The padded message i is buffer[offsets[i]:offsets[i + 1]].
+        """
+
+        block_size = self.block_size
+        if self._padder._random:
+            table = None
+            pad = self._padder._pad
+        else:
+            table = [self._padder._pad(n) for n in range(block_size, 0, -1)]
+
+        parts = []
+        sizes = []
+        for message in messages:
+            size = len(message)
+            tail = table[size % block_size] if table else pad(block_size - size % block_size)
+            parts.append(message)
+            parts.append(tail)
+            sizes.append(size + len(tail))
+        return b''.join(parts), _accumulate(sizes)
+
+    def unpad_many(self, buffer, offsets):
+        """Unpad each message in buffer and return list of unpadded messages.
+
+        The padded message i is buffer[offsets[i]:offsets[i + 1]]. If NumPy is available, all
+        paddings are checked at once.
+        """
+
+        if numpy is not None:
+            sizes = self._unpadded_sizes_numpy(buffer, offsets)
+        else:
+            sizes = self._unpadded_sizes(buffer, offsets)
+
+        with memoryview(buffer) as view:
+            return [bytes(view[start:start + size]) for start, size in zip(offsets, sizes)]
+
+    def _unpadded_sizes(self, buffer, offsets):
+        with memoryview(buffer) as view:
+            return [self._unpadded_size(view[start:end])
+                    for start, end in zip(offsets, offsets[1:])]
+
+    def _unpadded_sizes_numpy(self, buffer, offsets):
+        block_size = self.block_size
+        data = numpy.frombuffer(buffer, dtype=numpy.uint8)
+        offsets = numpy.asarray(offsets, dtype=numpy.int64)
+        ends = offsets[1:]
+        sizes = ends - offsets[:-1]
+        if len(sizes) == 0:
+            return []
+
+        if (sizes % block_size).any():
+            raise ValueError('require len(data) % {} == 0'.format(block_size))
+        if (sizes < block_size).any():
+            raise ValueError('incomplete padding')
+
+        padded_sizes = data[ends - 1].astype(numpy.int64)
+        if ((padded_sizes == 0) | (padded_sizes > block_size)).any():
+            raise ValueError('invalid padding')
+        self._unpadder._check_many(data, ends, padded_sizes)
+
+        return (sizes - padded_sizes).tolist()
+
+    def _padding(self, size):
+        """Return the padding for data of given size."""
+
+        block_size = self.block_size
+        return self._padder._pad(block_size - size % block_size)
+
+    def _unpadded_size(self, data):
+        """Check the padding of data and return the size of unpadded data."""
+
+        block_size = self.block_size
+        size = len(data)
+        if size % block_size != 0:
+            raise ValueError('require len(data) % {} == 0'.format(block_size))
+        if size < block_size:
+            raise ValueError('incomplete padding')
+
+        padded_size = data[-1]
+        if padded_size == 0 or padded_size > block_size:
+            raise ValueError('invalid padding')
+        self._unpadder._check(data, padded_size)
+
+        return size - padded_size
 
 
 class _PadderFramework(Padder):
+    __slots__ = ('block_size', '_size')
+
+    # Whether the padding differs between calls, so that it can not be precomputed.
+    _random = False
+
     def __init__(self, block_size):
         self.block_size = block_size
         self._size = 0
@@ -101,6 +222,8 @@ class _PadderFramework(Padder):
 
 
 class _UnpadderFramework(Unpadder):
+    __slots__ = ('block_size', '_buffer')
+
     def __init__(self, block_size):
         self.block_size = block_size
         self._buffer = b''
@@ -120,23 +243,29 @@ class _UnpadderFramework(Unpadder):
 
     def finalize(self):
         block_size = self.block_size
-        if len(self._buffer) < block_size:
+        buffer = self._buffer
+        if len(buffer) < block_size:
             # This exception will be raised only when `block_size == 0`, since
             # `update` method ensuring that `len(_buffer) % block_size == 0`.
             raise ValueError('incomplete padding')
 
-        padded_size = self._buffer[-1]
+        padded_size = buffer[-1]
         if padded_size == 0 or padded_size > block_size:
             raise ValueError('invalid padding')
-        self._check(self._buffer, padded_size)
+        self._check(buffer, padded_size)
 
-        return self._buffer[:-padded_size]
+        return buffer[:-padded_size]
 
     @staticmethod
     @abc.abstractmethod
     def _check(buffer, padded_size):
         """Check the padding."""
 
+    @staticmethod
+    @abc.abstractmethod
+    def _check_many(data, ends, padded_sizes):
+        """Check the paddings ending at ends in NumPy array, all at once."""
+
 
 # ============================================================================ #
 #                               Implementations                                #
@@ -147,6 +276,8 @@ class _UnpadderFramework(Unpadder):
 
 
 class DUMMY(Padding):
+    __slots__ = ()
+
     def __init__(self, block_size):
         pass
 
@@ -162,8 +293,24 @@ class DUMMY(Padding):
     def unpad(self, data):
         return data
 
+    def pad_many(self, messages):
+        messages = list(messages)
+        return b''.join(messages), _accumulate(len(message) for message in messages)
+
+    def unpad_many(self, buffer, offsets):
+        with memoryview(buffer) as view:
+            return [bytes(view[start:end]) for start, end in zip(offsets, offsets[1:])]
+
+    def _padding(self, size):
+        return b''
+
+    def _unpadded_size(self, data):
+        return len(data)
+
 
 class DUMMYPadder(Padder):
+    __slots__ = ()
+
     def __init__(self, block_size):
         pass
 
@@ -175,6 +322,8 @@ class DUMMYPadder(Padder):
 
 
 class DUMMYUnpadder(Unpadder):
+    __slots__ = ()
+
     def __init__(self, block_size):
         pass
 
@@ -188,81 +337,115 @@ class DUMMYUnpadder(Unpadder):
 # 1. PKCS#7
 
 
-class PKCS7(_PaddingFramework):
-    def padder(self):
-        return PKCS7Padder(self.block_size)
-
-    def unpadder(self):
-        return PKCS7Unpadder(self.block_size)
-
-
 class PKCS7Padder(_PadderFramework):
+    __slots__ = ()
+
     @staticmethod
     def _pad(padded_size):
-        return padded_size.to_bytes(1, 'big') * padded_size
+        return bytes((padded_size,)) * padded_size
 
 
 class PKCS7Unpadder(_UnpadderFramework):
+    __slots__ = ()
+
     @staticmethod
     def _check(buffer, padded_size):
-        for i in range(2, padded_size + 1):
-            if buffer[-i] != padded_size:
-                raise ValueError('invalid padding')
+        if buffer[-padded_size:] != bytes((padded_size,)) * padded_size:
+            raise ValueError('invalid padding')
 
+    @staticmethod
+    def _check_many(data, ends, padded_sizes):
+        # Loop over padding positions, not over messages.
+        for i in range(2, int(padded_sizes.max()) + 1):
+            mask = padded_sizes >= i
+            if (data[ends[mask] - i] != padded_sizes[mask]).any():
+                raise ValueError('invalid padding')
 
-# 2. ANSI X9.23
 
+class PKCS7(_PaddingFramework):
+    __slots__ = ()
+    _padder = PKCS7Padder
+    _unpadder = PKCS7Unpadder
 
-class ANSIX923(_PaddingFramework):
-    def padder(self):
-        return ANSIX923Padder(self.block_size)
 
-    def unpadder(self):
-        return ANSIX923Unpadder(self.block_size)
+# 2. ANSI X9.23
 
 
 class ANSIX923Padder(_PadderFramework):
+    __slots__ = ()
+
     @staticmethod
     def _pad(padded_size):
-        return b'\x00' * (padded_size - 1) + padded_size.to_bytes(1, 'big')
+        return bytes(padded_size - 1) + bytes((padded_size,))
 
 
 class ANSIX923Unpadder(_UnpadderFramework):
+    __slots__ = ()
+
     @staticmethod
     def _check(buffer, padded_size):
-        for i in range(2, padded_size + 1):
-            if buffer[-i] != 0:
-                raise ValueError('invalid padding')
+        if buffer[-padded_size:-1] != bytes(padded_size - 1):
+            raise ValueError('invalid padding')
 
+    @staticmethod
+    def _check_many(data, ends, padded_sizes):
+        for i in range(2, int(padded_sizes.max()) + 1):
+            if data[ends[padded_sizes >= i] - i].any():
+                raise ValueError('invalid padding')
 
-# 3. ISO 10126
 
+class ANSIX923(_PaddingFramework):
+    __slots__ = ()
+    _padder = ANSIX923Padder
+    _unpadder = ANSIX923Unpadder
 
-class ISO10126(_PaddingFramework):
-    def padder(self):
-        return ISO10126Padder(self.block_size)
 
-    def unpadder(self):
-        return ISO10126Unpadder(self.block_size)
+# 3. ISO 10126
 
 
 class ISO10126Padder(_PadderFramework):
+    __slots__ = ()
+    _random = True
+
     @staticmethod
     def _pad(padded_size):
-        return os.urandom(padded_size - 1) + padded_size.to_bytes(1, 'big')
+        return rand.urandom(padded_size - 1) + bytes((padded_size,))
 
 
 class ISO10126Unpadder(_UnpadderFramework):
+    __slots__ = ()
+
     @staticmethod
     def _check(buffer, padded_size):
         pass    # no need to check
 
+    @staticmethod
+    def _check_many(data, ends, padded_sizes):
+        pass    # no need to check
+
+
+class ISO10126(_PaddingFramework):
+    __slots__ = ()
+    _padder = ISO10126Padder
+    _unpadder = ISO10126Unpadder
+
 
 # ============================================================================ #
 #                                  Utilities                                   #
 # ============================================================================ #
 
 
+def _accumulate(sizes):
+    """Return array of offsets, starting from 0, of consecutive items of given sizes."""
+
+    offsets = array.array('Q', [0])
+    end = 0
+    for size in sizes:
+        end += size
+        offsets.append(end)
+    return offsets
+
+
 _PADDING_REGISTRY = {
     'DUMMY': DUMMY,
     'PKCS7': PKCS7,
@@ -0,0 +1,220 @@
+"""Streaming compress-then-encrypt pipeline.
+
+Plaintext is read in chunks, optionally hashed, compressed by `zlib`, `bz2` or `lzma`, and
+fed to the encryptor context of any xycrypto cipher as it leaves the compressor, so nothing
+is buffered beyond a few chunks. With workers, the chunks are compressed as independent
+streams on a thread pool; the decompressor reads either layout, since it restarts whenever
+a stream ends with data left over.
+"""
+
+import bz2
+import collections
+import concurrent.futures
+import lzma
+import time
+import zlib
+
+from xycrypto import _readahead, tuning
+
+__all__ = [
+    'PipelineStats',
+    'compress_encrypt_fileobj', 'decrypt_decompress_fileobj',
+    'compress_encrypt_file', 'decrypt_decompress_file',
+]
+
+
+def _zlib_compressor(level):
+    return zlib.compressobj(-1 if level is None else level)
+
+
+def _bz2_compressor(level):
+    return bz2.BZ2Compressor(9 if level is None else level)
+
+
+def _lzma_compressor(level):
+    return lzma.LZMACompressor(preset=level)
+
+
+_COMPRESSION_REGISTRY = {
+    'zlib': (_zlib_compressor, zlib.decompressobj),
+    'bz2': (_bz2_compressor, bz2.BZ2Decompressor),
+    'lzma': (_lzma_compressor, lzma.LZMADecompressor),
+}
+
+
+def _lookup_compression(compression):
+    try:
+        return _COMPRESSION_REGISTRY[compression]
+    except KeyError:
+        raise ValueError(
+            'compression must be in {}, got {}'.format(set(_COMPRESSION_REGISTRY), compression)
+        ) from None
+
+
+class PipelineStats(object):
+    """Sizes, time and plaintext digest of one run of the pipeline."""
+
+    def __init__(self):
+        self.plaintext_size = 0
+        self.compressed_size = 0
+        self.ciphertext_size = 0
+        self.seconds = 0.0
+        self.digest = None
+
+    @property
+    def ratio(self):
+        """Compressed size divided by plaintext size."""
+
+        return self.compressed_size / self.plaintext_size if self.plaintext_size else 1.0
+
+    @property
+    def throughput(self):
+        """Plaintext bytes per second."""
+
+        return self.plaintext_size / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return '{}(plaintext_size={}, compressed_size={}, ratio={:.3f}, {:.1f} MB/s)'.format(
+            type(self).__name__, self.plaintext_size, self.compressed_size, self.ratio,
+            self.throughput / 1e6
+        )
+
+
+def _compress_chunk(new_compressor, level, chunk):
+    compressor = new_compressor(level)
+    return compressor.compress(chunk) + compressor.flush()
+
+
+def compress_encrypt_fileobj(src, dst, cipher, *, compression='zlib', level=None,
+                             hash_cls=None, chunk_size=None, workers=0):
+    """Compress and encrypt data from src file object, write the result to dst file object
+    and return `PipelineStats`.
+
+    If hash_cls is given, the digest of the plaintext is in the stats. If workers is nonzero,
+    chunks are compressed independently on that many threads, at a small cost in ratio.
+    """
+
+    new_compressor, _ = _lookup_compression(compression)
+    chunk_size = chunk_size or tuning.buffer_size()
+    stats = PipelineStats()
+    start = time.perf_counter()
+    ctx = cipher.encryptor()
+    hash_ctx = hash_cls() if hash_cls is not None else None
+
+    def emit(compressed):
+        stats.compressed_size += len(compressed)
+        temp = ctx.update(compressed)
+        stats.ciphertext_size += len(temp)
+        dst.write(temp)
+
+    def consume(chunk):
+        stats.plaintext_size += len(chunk)
+        if hash_ctx is not None:
+            hash_ctx.update(chunk)
+
+    chunks = _readahead.iter_chunks(src, chunk_size)
+    if workers:
+        # Keep at most two chunks per worker in flight, so memory stays bounded.
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            pending = collections.deque()
+            for chunk in chunks:
+                consume(chunk)
+                pending.append(pool.submit(_compress_chunk, new_compressor, level, chunk))
+                if len(pending) >= 2 * workers:
+                    emit(pending.popleft().result())
+            while pending:
+                emit(pending.popleft().result())
+            if not stats.plaintext_size:    # still write one, empty stream
+                emit(_compress_chunk(new_compressor, level, b''))
+    else:
+        compressor = new_compressor(level)
+        for chunk in chunks:
+            consume(chunk)
+            emit(compressor.compress(chunk))
+        emit(compressor.flush())
+
+    temp = ctx.finalize()
+    stats.ciphertext_size += len(temp)
+    dst.write(temp)
+
+    stats.seconds = time.perf_counter() - start
+    if hash_ctx is not None:
+        stats.digest = hash_ctx.finalize()
+    return stats
+
+
+def _decompress(state, data, max_length):
+    """Yield decompressed data of at most max_length bytes at a time, across streams."""
+
+    new_decompressor, decompressor = state
+    while True:
+        if decompressor.eof:
+            data = decompressor.unused_data + data
+            if not data:
+                break
+            decompressor = state[1] = new_decompressor()
+
+        out = decompressor.decompress(data, max_length)
+        if out:
+            yield out
+        if decompressor.eof:
+            data = b''  # the rest is in unused_data
+        elif isinstance(decompressor, (bz2.BZ2Decompressor, lzma.LZMADecompressor)):
+            data = b''
+            if decompressor.needs_input:
+                break
+        else:
+            data = decompressor.unconsumed_tail
+            if not data and len(out) < max_length:
+                break
+
+
+def decrypt_decompress_fileobj(src, dst, cipher, *, compression='zlib',
+                               hash_cls=None, chunk_size=None):
+    """Decrypt and decompress data from src file object, write the result to dst file object
+    and return `PipelineStats`.
+
+    If hash_cls is given, the digest of the plaintext is in the stats.
+    """
+
+    _, new_decompressor = _lookup_compression(compression)
+    chunk_size = chunk_size or tuning.buffer_size()
+    stats = PipelineStats()
+    start = time.perf_counter()
+    ctx = cipher.decryptor()
+    hash_ctx = hash_cls() if hash_cls is not None else None
+    state = [new_decompressor, new_decompressor()]
+
+    def feed(compressed):
+        stats.compressed_size += len(compressed)
+        for out in _decompress(state, compressed, chunk_size):
+            stats.plaintext_size += len(out)
+            if hash_ctx is not None:
+                hash_ctx.update(out)
+            dst.write(out)
+
+    for chunk in _readahead.iter_chunks(src, chunk_size):
+        stats.ciphertext_size += len(chunk)
+        feed(ctx.update(chunk))
+    feed(ctx.finalize())
+    if not state[1].eof:
+        raise ValueError('compressed data ended before the end of stream')
+
+    stats.seconds = time.perf_counter() - start
+    if hash_ctx is not None:
+        stats.digest = hash_ctx.finalize()
+    return stats
+
+
+def compress_encrypt_file(src, dst, cipher, **kwargs):
+    """Compress and encrypt data from src file and write the result to dst file."""
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        return compress_encrypt_fileobj(fsrc, fdst, cipher, **kwargs)
+
+
+def decrypt_decompress_file(src, dst, cipher, **kwargs):
+    """Decrypt and decompress data from src file and write the result to dst file."""
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        return decrypt_decompress_fileobj(fsrc, fdst, cipher, **kwargs)
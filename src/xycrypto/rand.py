@@ -0,0 +1,71 @@
+import os
+import threading
+import weakref
+
+__all__ = ['RandomPool', 'urandom']
+
+_BUFFER_SIZE = 0x1000
+
+# Where `os.register_at_fork` is available, the pools are reset in the child after fork;
+# elsewhere, every request compares the pid instead.
+_AT_FORK = hasattr(os, 'register_at_fork')
+_pools = weakref.WeakSet()
+
+
+def _reset_pools():
+    for pool in list(_pools):
+        pool._reset()
+
+
+if _AT_FORK:
+    os.register_at_fork(after_in_child=_reset_pools)
+
+
+class RandomPool(object):
+    """Thread-safe, fork-safe pool of random bytes from `os.urandom`.
+
+    The pool refills its buffer in bulk, so that small requests do not cost one system call
+    each. Every thread has its own buffer, so no lock is taken. Bytes are handed out once and
+    never reused. Requests larger than the buffer bypass the pool. After a fork, the child
+    discards the bytes inherited from the parent.
+    """
+
+    def __init__(self, buffer_size=_BUFFER_SIZE):
+        if buffer_size < 1:
+            raise ValueError('buffer_size must be >= 1, got {}'.format(buffer_size))
+
+        self.buffer_size = buffer_size
+        self._reset()
+        _pools.add(self)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._local = threading.local()
+
+    def urandom(self, size):
+        """Return a bytes object containing size random bytes."""
+
+        if size > self.buffer_size:
+            return os.urandom(size)
+
+        if not _AT_FORK and self._pid != os.getpid():
+            self._reset()
+
+        local = self._local
+        try:
+            buffer, offset = local.buffer, local.offset
+        except AttributeError:  # first request of this thread
+            buffer, offset = b'', 0
+
+        end = offset + size
+        if end > len(buffer):
+            buffer = local.buffer = os.urandom(self.buffer_size)
+            offset, end = 0, size
+        local.offset = end
+        return buffer[offset:end]
+
+
+_pool = RandomPool()
+
+# Return a bytes object containing size random bytes from the shared pool.
+urandom = _pool.urandom
@@ -0,0 +1,529 @@
+"""Local crypto worker service over a Unix socket.
+
+Short-lived processes pay for interpreter startup, imports and context setup on every run.
+A long-lived `Server` keeps prepared ciphers and HMAC contexts warm and serves `Hash.hash`,
+`HMAC.hash` and cipher `encrypt`/`decrypt` to any number of `Client` connections. Requests
+which arrive together are coalesced into batches, and the time every request spent queued is
+reported back. If no server is reachable, the client runs the same code in process.
+
+Run a server with `python -m xycrypto.service <socket path>`.
+"""
+
+import argparse
+import base64
+import collections
+import concurrent.futures
+import functools
+import inspect
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import struct
+import threading
+import time
+
+from xycrypto import ciphers, hashes, tuning
+from xycrypto._cache import TTLCache
+from xycrypto.ciphers import base
+from xycrypto.ciphers.cache import CipherCache
+from xycrypto.hmac import HMAC
+
+__all__ = ['Server', 'Client']
+
+_LENGTH = struct.Struct('>I')
+_BATCH_SIZE = 64
+_CACHE_SIZE = 1024
+_ERRORS = {'ValueError': ValueError, 'TypeError': TypeError}
+_EXECUTORS = {'serial', 'thread', 'process'}
+_OPS = {'hash', 'hmac', 'encrypt', 'decrypt'}
+
+
+# ============================================================================ #
+#                                   Protocol                                   #
+# ============================================================================ #
+
+
+def _encode(obj):
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return {'$b': base64.b64encode(obj).decode('ascii')}
+    if isinstance(obj, dict):
+        return {k: _encode(v) for k, v in obj.items()}
+    return obj
+
+
+def _decode(obj):
+    if isinstance(obj, dict):
+        if '$b' in obj:
+            return base64.b64decode(obj['$b'])
+        return {k: _decode(v) for k, v in obj.items()}
+    return obj
+
+
+def _send(sock, message):
+    body = json.dumps(_encode(message)).encode('utf-8')
+    sock.sendall(_LENGTH.pack(len(body)) + body)
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        data = sock.recv(size - len(buffer))
+        if not data:
+            return None
+        buffer += data
+    return bytes(buffer)
+
+
+def _recv(sock):
+    header = _recv_exact(sock, _LENGTH.size)
+    if header is None:
+        return None
+    body = _recv_exact(sock, _LENGTH.unpack(header)[0])
+    if body is None:
+        return None
+    return _decode(json.loads(body.decode('utf-8')))
+
+
+# ============================================================================ #
+#                                    Worker                                    #
+# ============================================================================ #
+
+
+def _lookup(module, name, base_cls):
+    cls = getattr(module, name, None)
+    if not (isinstance(cls, type) and issubclass(cls, base_cls)) or inspect.isabstract(cls):
+        raise ValueError('unknown algorithm {!r}'.format(name))
+    return cls
+
+
+def _error(e):
+    return {'error': type(e).__name__, 'message': str(e)}
+
+
+def _check_request(request):
+    """Raise TypeError or ValueError unless request is well-formed."""
+
+    if not isinstance(request, dict):
+        raise TypeError('request must be an object, got {}'.format(type(request).__name__))
+    op = request.get('op')
+    if op not in _OPS:
+        raise ValueError('unknown op {!r}'.format(op))
+    if not isinstance(request.get('algorithm'), str):
+        raise TypeError('algorithm must be str, got {!r}'.format(request.get('algorithm')))
+    key = request.get('key')
+    if not (isinstance(key, bytes) or key is None and op == 'hash'):
+        raise TypeError('key must be bytes, got {}'.format(type(key).__name__))
+    if not isinstance(request.get('kwargs') or {}, dict):
+        raise TypeError('kwargs must be an object, got {!r}'.format(request.get('kwargs')))
+    if not isinstance(request.get('data'), (bytes, str)):
+        raise TypeError('data must be bytes, got {}'.format(type(request.get('data')).__name__))
+
+
+def _group_key(request):
+    # Requests alike in everything but data share one prepared context. The key orders
+    # totally, so requests can be sorted by it.
+    return (str(request.get('op')), str(request.get('algorithm')), request.get('key') or b'',
+            repr(sorted((request.get('kwargs') or {}).items())))
+
+
+class _Worker(object):
+    """Execute requests with warm ciphers and HMAC contexts."""
+
+    def __init__(self, cache_size=_CACHE_SIZE):
+        self._ciphers = CipherCache(cache_size)
+        self._macs = TTLCache(cache_size)
+
+    def _prepare(self, request):
+        """Return function of data which executes request."""
+
+        op = request['op']
+        kwargs = request.get('kwargs') or {}
+
+        if op == 'hash':
+            hash_cls = _lookup(hashes, request['algorithm'], hashes.Hash)
+            return functools.partial(hash_cls.hash, **kwargs)
+
+        if op == 'hmac':
+            hash_cls = _lookup(hashes, request['algorithm'], hashes.Hash)
+            key = request['key']
+            mac = self._macs.get_or_compute((hash_cls, key), lambda: HMAC(hash_cls, key))
+
+            def run(data):
+                ctx = mac.copy()
+                ctx.update(data)
+                return ctx.finalize()
+
+            return run
+
+        if op in {'encrypt', 'decrypt'}:
+            cipher_cls = _lookup(ciphers, request['algorithm'], base.Cipher)
+            cipher = self._ciphers.cipher(cipher_cls, request['key'], **kwargs)
+            return cipher.encrypt if op == 'encrypt' else cipher.decrypt
+
+        raise ValueError('unknown op {!r}'.format(op))
+
+    def execute(self, request):
+        return self._prepare(request)(request['data'])
+
+    def execute_batch(self, requests):
+        """Return list of responses to requests, preparing one context per group of alike."""
+
+        responses = [None] * len(requests)
+        groups = collections.defaultdict(list)
+        for i, request in enumerate(requests):
+            groups[_group_key(request)].append(i)
+
+        for indices in groups.values():
+            try:
+                run = self._prepare(requests[indices[0]])
+            except Exception as e:
+                for i in indices:
+                    responses[i] = _error(e)
+                continue
+
+            for i in indices:
+                try:
+                    responses[i] = {'result': run(requests[i]['data'])}
+                except Exception as e:
+                    responses[i] = _error(e)
+        return responses
+
+
+_process_worker = None
+
+
+def _execute_in_process(requests, cache_size):
+    # Every worker process keeps its own warm contexts across batches.
+    global _process_worker
+
+    if _process_worker is None:
+        _process_worker = _Worker(cache_size)
+    return _process_worker.execute_batch(requests)
+
+
+# ============================================================================ #
+#                                    Server                                    #
+# ============================================================================ #
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request = _recv(self.request)
+                if request is None:
+                    return
+                _check_request(request)
+            except (TypeError, ValueError) as e:  # answer a malformed request right away
+                _send(self.request, dict(_error(e), latency=0.0))
+                continue
+            future = concurrent.futures.Future()
+            self.server.service._submit(request, future)
+            _send(self.request, future.result())
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _remove_socket(path, strict):
+    """Remove the socket at path. Anything else there is left alone, or raises if strict."""
+
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return
+    if stat.S_ISSOCK(st.st_mode):
+        os.remove(path)
+    elif strict:
+        raise FileExistsError('{} exists and is not a socket'.format(path))
+
+
+class Server(object):
+    """Serve crypto requests on the Unix socket at path.
+
+    Requests from all connections go through one queue. The batcher takes whatever is queued,
+    up to batch_size requests, waiting at most batch_delay seconds for more, and splits the
+    batch among the workers, keeping alike requests together so they share one prepared
+    context. The executor is 'serial', 'thread' or 'process'; with 'process', every worker
+    process keeps its own warm contexts and all cores are used, and batching amortizes the
+    round trip to the worker.
+    """
+
+    def __init__(self, path, *, executor='process', workers=None, batch_size=_BATCH_SIZE,
+                 batch_delay=0.0, cache_size=_CACHE_SIZE):
+        if executor not in _EXECUTORS:
+            raise ValueError('executor must be in {}, got {}'.format(_EXECUTORS, executor))
+
+        self.path = os.fspath(path)
+        self.executor = executor
+        self.workers = 1 if executor == 'serial' else workers or tuning.workers()
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self._cache_size = cache_size
+        self._worker = _Worker(cache_size)
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(2 * self.workers)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+        _remove_socket(self.path, strict=True)
+        self._server = _UnixServer(self.path, _Handler)
+        self._server.service = self
+        self._pool = None
+        self._threads = []
+        self._serving = False
+        self._closed = False
+
+    def _submit(self, request, future):
+        self._queue.put((request, future, time.monotonic()))
+
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is None:
+            return None
+
+        batch = [item]
+        deadline = time.monotonic() + self.batch_delay
+        while len(batch) < self.batch_size:
+            try:
+                timeout = deadline - time.monotonic()
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)   # stop after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _split(self, batch):
+        batch.sort(key=lambda item: _group_key(item[0]))
+        size = -(-len(batch) // self.workers)
+        return [batch[i:i + size] for i in range(0, len(batch), size)]
+
+    def _dispatch(self, part):
+        requests = [request for request, _, _ in part]
+        dispatched = time.monotonic()
+        future = concurrent.futures.Future()
+        try:
+            if self._pool is None:
+                future.set_result(self._worker.execute_batch(requests))
+            elif self.executor == 'process':
+                future = self._pool.submit(_execute_in_process, requests, self._cache_size)
+            else:
+                future = self._pool.submit(self._worker.execute_batch, requests)
+        except Exception as e:  # the pool is broken; fail this part, which frees its slot
+            future = concurrent.futures.Future()
+            future.set_exception(e)
+        future.add_done_callback(functools.partial(self._complete, part, dispatched))
+
+    def _complete(self, part, dispatched, future):
+        self._slots.release()
+        try:
+            responses = future.result()
+        except Exception as e:  # the worker died, or could not take the requests
+            responses = [_error(e)] * len(part)
+
+        for (_, result, enqueued), response in zip(part, responses):
+            latency = dispatched - enqueued
+            with self._lock:
+                self._requests += 1
+                self._total_latency += latency
+                self._max_latency = max(self._max_latency, latency)
+            result.set_result(dict(response, latency=latency))
+
+    def _run_batches(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            with self._lock:
+                self._batches += 1
+            try:
+                parts = self._split(batch)
+            except Exception as e:  # fail this batch only and keep serving
+                for _, result, _ in batch:
+                    result.set_result(dict(_error(e), latency=0.0))
+                continue
+            for part in parts:
+                self._slots.acquire()   # keep at most two parts per worker in flight
+                self._dispatch(part)
+
+    def stats(self):
+        """Return dict of request, batch and queueing latency statistics."""
+
+        with self._lock:
+            requests = self._requests
+            return {
+                'requests': requests,
+                'batches': self._batches,
+                'mean_latency': self._total_latency / requests if requests else 0.0,
+                'max_latency': self._max_latency,
+            }
+
+    def _start_batcher(self):
+        if self.executor == 'thread':
+            self._pool = concurrent.futures.ThreadPoolExecutor(self.workers)
+        elif self.executor == 'process':
+            self._pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+        thread = threading.Thread(target=self._run_batches, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def start(self):
+        """Start serving on background threads."""
+
+        self._start_batcher()
+        self._serving = True
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def serve_forever(self):
+        """Serve on the current thread until `shutdown` is called from another thread."""
+
+        self._start_batcher()
+        self._serving = True
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """Stop serving and remove the socket."""
+
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._serving:
+            self._server.shutdown()
+        self._server.server_close()
+        self._queue.put(None)
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+        _remove_socket(self.path, strict=False)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+# ============================================================================ #
+#                                    Client                                    #
+# ============================================================================ #
+
+
+class Client(object):
+    """Client of the crypto service at path.
+
+    If path is None, or no server listens there and fallback is true, requests run in
+    process instead. The `remote` attribute tells which one is used, and `latency` is the
+    queueing latency in seconds of the last request (0 in process).
+    """
+
+    def __init__(self, path=None, *, fallback=True):
+        self._sock = None
+        self.latency = 0.0
+        if path is not None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(os.fspath(path))
+                self._sock = sock
+            except OSError:
+                sock.close()
+                if not fallback:
+                    raise
+        self._worker = None if self._sock is not None else _Worker()
+
+    @property
+    def remote(self):
+        return self._sock is not None
+
+    def _call(self, request):
+        if self._sock is None:
+            return self._worker.execute(request)
+
+        _send(self._sock, request)
+        response = _recv(self._sock)
+        if response is None:
+            raise ConnectionError('connection closed by the server')
+        self.latency = response['latency']
+        if 'error' in response:
+            raise _ERRORS.get(response['error'], RuntimeError)(response['message'])
+        return response['result']
+
+    def hash(self, algorithm, data, **kwargs):
+        """Return hash of data, like `Hash.hash` of the named hash class."""
+
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return self._call({'op': 'hash', 'algorithm': algorithm, 'data': data, 'kwargs': kwargs})
+
+    def hmac(self, algorithm, key, data):
+        """Return HMAC of data, like `HMAC.hash` with the named hash class."""
+
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return self._call({'op': 'hmac', 'algorithm': algorithm, 'key': key, 'data': data})
+
+    def encrypt(self, algorithm, key, data, **kwargs):
+        """Encrypt data by the named cipher class, constructed with key and kwargs."""
+
+        return self._call({
+            'op': 'encrypt', 'algorithm': algorithm, 'key': key, 'data': data, 'kwargs': kwargs
+        })
+
+    def decrypt(self, algorithm, key, data, **kwargs):
+        """Decrypt data by the named cipher class, constructed with key and kwargs."""
+
+        return self._call({
+            'op': 'decrypt', 'algorithm': algorithm, 'key': key, 'data': data, 'kwargs': kwargs
+        })
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the local xycrypto worker service.')
+    parser.add_argument('path', help='path of the Unix socket')
+    parser.add_argument('--batch-size', type=int, default=_BATCH_SIZE)
+    parser.add_argument('--batch-delay', type=float, default=0.0, help='seconds')
+    parser.add_argument('--executor', choices=sorted(_EXECUTORS), default='process')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    server = Server(
+        args.path, executor=args.executor, workers=args.workers,
+        batch_size=args.batch_size, batch_delay=args.batch_delay
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
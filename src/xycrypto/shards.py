@@ -0,0 +1,117 @@
+"""Partial directory digests, for hashing a tree in shards and combining the results.
+
+The digest of a directory is the XOR of the digests of its files, which does not depend on
+order or grouping. A shard of the file list can therefore be hashed anywhere, on another
+process or machine, into a `PartialDigest`, and the partials merged into the same value as
+hashing the whole tree at once.
+"""
+
+import concurrent.futures
+import json
+
+from xycrypto import tuning
+
+__all__ = ['PartialDigest', 'merge_partials', 'hash_sharded']
+
+
+class PartialDigest(object):
+    """XOR accumulator of file digests, with the count of files and the algorithm id."""
+
+    def __init__(self, algorithm, digest_size, accumulator=0, count=0):
+        self.algorithm = algorithm
+        self.digest_size = digest_size
+        self.accumulator = accumulator
+        self.count = count
+
+    @classmethod
+    def from_digests(cls, algorithm, digest_size, digests):
+        """Return partial digest of the file digests."""
+
+        accumulator = 0
+        count = 0
+        for digest in digests:
+            accumulator ^= int.from_bytes(digest, 'big')
+            count += 1
+        return cls(algorithm, digest_size, accumulator, count)
+
+    def merge(self, other):
+        """Return partial digest of the files of both partial digests."""
+
+        if (self.algorithm, self.digest_size) != (other.algorithm, other.digest_size):
+            raise ValueError('can not merge {} with {}'.format(self.algorithm, other.algorithm))
+        return type(self)(
+            self.algorithm, self.digest_size,
+            self.accumulator ^ other.accumulator, self.count + other.count
+        )
+
+    def digest(self):
+        """Return the digest of all files merged so far."""
+
+        return self.accumulator.to_bytes(self.digest_size, 'big')
+
+    def to_json(self):
+        """Return the partial digest serialized as JSON string."""
+
+        return json.dumps({
+            'algorithm': self.algorithm,
+            'digest_size': self.digest_size,
+            'accumulator': self.digest().hex(),
+            'count': self.count
+        })
+
+    @classmethod
+    def from_json(cls, s):
+        """Return the partial digest deserialized from JSON string."""
+
+        obj = json.loads(s)
+        return cls(
+            obj['algorithm'], obj['digest_size'],
+            int(obj['accumulator'], 16), obj['count']
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, PartialDigest):
+            return NotImplemented
+        return (
+            (self.algorithm, self.digest_size, self.accumulator, self.count)
+            == (other.algorithm, other.digest_size, other.accumulator, other.count)
+        )
+
+    def __repr__(self):
+        return '{}({!r}, {}, {:#x}, {})'.format(
+            type(self).__name__, self.algorithm, self.digest_size, self.accumulator, self.count
+        )
+
+
+def merge_partials(partials):
+    """Return partial digest of the files of all partial digests."""
+
+    partials = iter(partials)
+    try:
+        result = next(partials)
+    except StopIteration:
+        raise ValueError('require at least one partial digest') from None
+
+    for partial in partials:
+        result = result.merge(partial)
+    return result
+
+
+def hash_sharded(func, paths, shards=None, workers=None):
+    """Split paths into shards, hash them on worker processes and return the merged result.
+
+    The func takes a list of paths and returns a `PartialDigest`, for example
+    `SHA256.hash_paths_partial`; it must be picklable. This is a local coordinator: the
+    shards could equally be sent to other machines and merged by `merge_partials`.
+    """
+
+    paths = list(paths)
+    workers = workers or tuning.workers()
+    shards = shards or workers
+    size = max(-(-len(paths) // shards), 1)
+    chunks = [paths[i:i + size] for i in range(0, len(paths), size)] or [[]]
+
+    if len(chunks) == 1:
+        return func(chunks[0])
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        return merge_partials(pool.map(func, chunks))
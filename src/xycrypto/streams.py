@@ -0,0 +1,157 @@
+import errno
+import io
+
+from xycrypto import tuning
+
+__all__ = ['HashingReader', 'HashingWriter', 'EncryptingWriter', 'DecryptingReader']
+
+
+class _StreamWrapper(io.RawIOBase):
+    """Base class of wrappers around binary file object.
+
+    Closing the wrapper does not close the underlying file object.
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+
+    @property
+    def fileobj(self):
+        """The underlying file object."""
+
+        return self._fileobj
+
+
+class HashingReader(_StreamWrapper):
+    """Read from binary file object and update the hash context with data read."""
+
+    def __init__(self, fileobj, ctx):
+        super().__init__(fileobj)
+        self.ctx = ctx
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self._fileobj.readinto(b)
+        if n:
+            with memoryview(b) as view:
+                self.ctx.update(view[:n])
+        return n
+
+
+class HashingWriter(_StreamWrapper):
+    """Write to binary file object and update the hash context with data written."""
+
+    def __init__(self, fileobj, ctx):
+        super().__init__(fileobj)
+        self.ctx = ctx
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        n = self._fileobj.write(b)
+        if n:
+            with memoryview(b) as view:
+                self.ctx.update(view[:n])
+        return n
+
+    def flush(self):
+        super().flush()
+        self._fileobj.flush()
+
+
+class EncryptingWriter(_StreamWrapper):
+    """Encrypt data by the cipher and write encrypted data to binary file object.
+
+    The file object may write less than asked: the rest of the encrypted data is written
+    before anything else, and kept back while a non-blocking file object would block, in
+    which case `flush` and `close` raise BlockingIOError and can be retried. The encryptor
+    context is finalized when the writer is closed.
+    """
+
+    def __init__(self, fileobj, cipher):
+        super().__init__(fileobj)
+        self._ctx = cipher.encryptor()
+        self._pending = memoryview(b'')
+
+    def writable(self):
+        return True
+
+    def _append(self, data):
+        if self._pending:
+            data = bytes(self._pending) + data
+        self._pending = memoryview(data)
+
+    def _drain(self):
+        """Write out the pending encrypted data; return whether all of it was written."""
+
+        while self._pending:
+            n = self._fileobj.write(self._pending)
+            if n is None:   # would block
+                return False
+            self._pending = self._pending[n:]
+        return True
+
+    def write(self, b):
+        if self.closed or self._ctx is None:
+            raise ValueError('write to closed file')
+
+        # The plaintext is taken whole; what the file object does not take is kept pending.
+        self._append(self._ctx.update(b))
+        self._drain()
+        return len(b)
+
+    def flush(self):
+        super().flush()
+        if not self._drain():
+            raise BlockingIOError(errno.EAGAIN, 'write could not complete without blocking', 0)
+        self._fileobj.flush()
+
+    def close(self):
+        if self.closed:
+            return
+
+        if self._ctx is not None:   # finalize once, even if close is retried
+            self._append(self._ctx.finalize())
+            self._ctx = None
+        if not self._drain():
+            raise BlockingIOError(errno.EAGAIN, 'write could not complete without blocking', 0)
+        try:
+            self._fileobj.flush()
+        finally:
+            super().close()
+
+
+class DecryptingReader(_StreamWrapper):
+    """Read encrypted data from binary file object and decrypt data by the cipher."""
+
+    def __init__(self, fileobj, cipher, chunk_size=None):
+        super().__init__(fileobj)
+        self._ctx = cipher.decryptor()
+        self._chunk_size = chunk_size or tuning.buffer_size()
+        self._buffer = b''
+        self._offset = 0
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._offset == len(self._buffer) and not self._eof:
+            data = self._fileobj.read(self._chunk_size)
+            if data is None:    # non-blocking file object without data for now
+                return None
+            if data:
+                self._buffer = self._ctx.update(data)
+            else:
+                self._buffer = self._ctx.finalize()
+                self._eof = True
+            self._offset = 0
+
+        with memoryview(b) as view, memoryview(self._buffer) as buffer:
+            n = min(len(view), len(buffer) - self._offset)
+            view[:n] = buffer[self._offset:self._offset + n]
+        self._offset += n
+        return n
@@ -0,0 +1,245 @@
+"""Tuning profile of the current machine.
+
+`calibrate` microbenchmarks the hash classes, some cipher modes, I/O block sizes and thread
+scaling, and persists the result as a JSON profile. The file, directory and cipher streaming
+APIs take their default buffer size and worker count from the profile if there is one, and
+fall back to fixed defaults otherwise. The profile lives at `~/.xycrypto/tuning.json`, or
+wherever the XYCRYPTO_TUNING environment variable points.
+"""
+
+import concurrent.futures
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+
+__all__ = ['calibrate', 'load_profile', 'buffer_size', 'workers', 'recommend_hash', 'report']
+
+_BUFFER_SIZE = 0x100000
+_DATA_SIZE = 0x400000
+_IO_SIZE = 0x4000000
+_IO_BLOCK_SIZES = (0x10000, 0x40000, 0x100000, 0x400000, 0x1000000)
+_REPEAT = 3
+_COLD_READS = hasattr(os, 'posix_fadvise')
+
+# Collision resistance in bits of the hash classes with their default digest sizes.
+_SECURITY = {
+    'MD5': 0, 'SHA1': 0,
+    'SHA224': 112, 'SHA256': 128, 'SHA384': 192, 'SHA512': 256,
+    'SHA3_224': 112, 'SHA3_256': 128, 'SHA3_384': 192, 'SHA3_512': 256,
+    'SHAKE128': 64, 'SHAKE256': 128, 'BLAKE2b': 256, 'BLAKE2s': 128,
+}
+
+_CIPHERS = (
+    ('AES_CTR', {'nonce': bytes(16)}, 16),
+    ('AES_CBC', {'iv': bytes(16), 'padding': None}, 16),
+    ('AES_GCM', {'nonce': bytes(12)}, 16),
+    ('ChaCha20', {'nonce': bytes(16)}, 32),
+    ('ChaCha20Poly1305', {'nonce': bytes(12)}, 32),
+)
+
+_lock = threading.Lock()
+_profile = None
+_loaded = False
+
+
+def _default_path():
+    return os.environ.get('XYCRYPTO_TUNING') or os.path.join(
+        os.path.expanduser('~'), '.xycrypto', 'tuning.json'
+    )
+
+
+def load_profile(path=None):
+    """Load the tuning profile, or return None if there is none. The result is cached."""
+
+    global _profile, _loaded
+
+    with _lock:
+        if path is None and _loaded:
+            return _profile
+        try:
+            with open(path or _default_path(), 'r') as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            profile = None
+        if not isinstance(profile, dict):
+            profile = None
+        _profile, _loaded = profile, True
+        return profile
+
+
+def _positive_int(name, default):
+    # A zero buffer size would read nothing and a negative one the whole file, so a value
+    # which is not a positive int falls back to the default.
+    profile = load_profile()
+    value = profile.get(name) if profile else None
+    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return value
+    return default
+
+
+def buffer_size():
+    """Return the buffer size in bytes for streaming files."""
+
+    return _positive_int('buffer_size', _BUFFER_SIZE)
+
+
+def workers():
+    """Return the number of workers for parallel hashing and encryption."""
+
+    return _positive_int('workers', os.cpu_count() or 1)
+
+
+def _throughput(func, size, setup=None):
+    best = float('inf')
+    for _ in range(_REPEAT):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return size / best
+
+
+def _bench_hashes(data):
+    from xycrypto import hashes
+
+    return {name: _throughput(lambda: getattr(hashes, name).hash(data), len(data))
+            for name in hashes.__all__}
+
+
+def _bench_ciphers(data):
+    from xycrypto import ciphers
+
+    result = {}
+    for name, kwargs, key_size in _CIPHERS:
+        cipher = getattr(ciphers, name)(bytes(key_size), **kwargs)
+        result[name] = _throughput(lambda: cipher.encrypt(data), len(data))
+    return result
+
+
+def _drop_cache(f):
+    # The file was just written, so without this the reads would hit the page cache and
+    # measure memory rather than the storage. The pages are clean after fsync.
+    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _bench_io(directory, size):
+    result = {}
+    with tempfile.NamedTemporaryFile(dir=directory) as f:
+        f.write(os.urandom(0x100000) * (size // 0x100000))
+        f.flush()
+        os.fsync(f.fileno())
+        setup = functools.partial(_drop_cache, f) if _COLD_READS else None
+        for block_size in _IO_BLOCK_SIZES:
+            view = memoryview(bytearray(block_size))
+
+            def read():
+                with open(f.name, 'rb', buffering=0) as g:
+                    while g.readinto(view):
+                        pass
+
+            result[block_size] = _throughput(read, size, setup)
+    return result
+
+
+def _bench_workers(data):
+    from xycrypto import hashes
+
+    result = {}
+    count = os.cpu_count() or 1
+    n = 1
+    while True:
+        with concurrent.futures.ThreadPoolExecutor(n) as pool:
+            def run():
+                list(pool.map(hashes.SHA256.hash, [data] * (2 * n)))
+            result[n] = _throughput(run, len(data) * 2 * n)
+        if n >= count:
+            return result
+        n = min(n * 2, count)
+
+
+def calibrate(directory=None, *, io_size=_IO_SIZE, save=True, path=None):
+    """Benchmark this machine and return the tuning profile, persisting it if save is true.
+
+    The I/O block sizes are measured on a temporary file of io_size bytes in directory, so
+    pass a directory on the storage that will be hashed or encrypted. The file is dropped
+    from the page cache before every read where `os.posix_fadvise` exists; elsewhere the
+    reads are likely served from memory, and the profile records 'io_cold': false.
+    """
+
+    global _profile, _loaded
+
+    data = os.urandom(_DATA_SIZE)
+    io = _bench_io(directory, io_size)
+    scaling = _bench_workers(data)
+    best = max(scaling.values())
+
+    profile = {
+        'version': 1,
+        # The smallest block size and worker count within 5% of the best.
+        'buffer_size': min(k for k, v in io.items() if v >= 0.95 * max(io.values())),
+        'workers': min(k for k, v in scaling.items() if v >= 0.95 * best),
+        'hashes': _bench_hashes(data),
+        'ciphers': _bench_ciphers(data),
+        'io': {str(k): v for k, v in io.items()},
+        'io_cold': _COLD_READS,
+        'scaling': {str(k): v for k, v in scaling.items()},
+    }
+
+    if save:
+        path = path or _default_path()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(profile, f, indent=2)
+    with _lock:
+        _profile, _loaded = profile, True
+    return profile
+
+
+def recommend_hash(security_bits=128, profile=None):
+    """Return the name of the fastest hash class with at least security_bits of collision
+    resistance, according to the profile.
+    """
+
+    profile = profile or load_profile()
+    if not profile:
+        raise ValueError('no tuning profile, run calibrate() first')
+
+    candidates = [(speed, name) for name, speed in profile['hashes'].items()
+                  if _SECURITY.get(name, 0) >= security_bits]
+    if not candidates:
+        raise ValueError('no hash with {} bits of security'.format(security_bits))
+    return max(candidates)[1]
+
+
+def report(profile=None):
+    """Return a human-readable report of the tuning profile."""
+
+    profile = profile or load_profile()
+    if not profile:
+        raise ValueError('no tuning profile, run calibrate() first')
+
+    lines = [
+        'buffer size: {} KiB'.format(profile['buffer_size'] // 1024),
+        'workers: {}'.format(profile['workers']),
+        '',
+        'hashes (MB/s, collision bits):',
+    ]
+    for name, speed in sorted(profile['hashes'].items(), key=lambda item: -item[1]):
+        lines.append('  {:<10} {:10.1f} {:>5}'.format(name, speed / 1e6, _SECURITY.get(name, 0)))
+    lines.append('')
+    lines.append('ciphers (MB/s):')
+    for name, speed in sorted(profile['ciphers'].items(), key=lambda item: -item[1]):
+        lines.append('  {:<18} {:10.1f}'.format(name, speed / 1e6))
+    lines.append('')
+    for bits in (112, 128, 192, 256):
+        lines.append('fastest hash for {} bits: {}'.format(bits, recommend_hash(bits, profile)))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    calibrate()
+    print(report())